@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, Order, OrderItem, Category
+from .models import Product, Order, OrderItem, Category, OrderStatusHistory, EmailOutbox
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
 from django.utils.translation import gettext_lazy as _
@@ -11,10 +11,20 @@ class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
 
+# Status changes made through Order.transition_status, read-only
+class OrderStatusHistoryInline(admin.TabularInline):
+    model = OrderStatusHistory
+    extra = 0
+    can_delete = False
+    readonly_fields = ['from_status', 'to_status', 'changed_by', 'created_at']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 # Customize Order admin panel
 class OrderAdmin(admin.ModelAdmin):
     list_display = ['id', 'user', 'total_price', 'status', 'created_at']
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, OrderStatusHistoryInline]
 
 # Custom User Admin
 class CustomUserAdmin(UserAdmin):
@@ -48,4 +58,10 @@ admin.site.register(OrderItem)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'description']
 
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['recipient', 'subject']
+
 admin.site.register(User, CustomUserAdmin)
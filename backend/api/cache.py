@@ -0,0 +1,106 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+# Version names. A cached payload is stored under the current value of every
+# version it depends on, so bumping a version makes the old entries unreachable.
+PRODUCT_LIST_VERSION = 'products'
+CATEGORY_LIST_VERSION = 'categories'
+# Part of every key; bumped by bulk writes that bypass model signals
+CATALOG_VERSION = 'catalog'
+
+STATS_HITS = 'catalog:stats:hits'
+STATS_MISSES = 'catalog:stats:misses'
+
+_MISSING = object()
+
+
+def product_version(product_id):
+    return f'product:{product_id}'
+
+
+def incr_counter(key, delta=1):
+    """Atomically adds delta to a counter that never expires, creating it if missing."""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        # incr() refuses unknown keys on locmem/file caches
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def bump_versions(*names):
+    for name in names:
+        incr_counter(f'catalog:v:{name}')
+
+
+def bump_product(product_id):
+    """Invalidates one product's detail payload and every product list."""
+    bump_versions(product_version(product_id), PRODUCT_LIST_VERSION)
+
+
+def bump_products(product_ids):
+    """bump_product for several products, for queryset updates that skip signals."""
+    bump_versions(*[product_version(pk) for pk in product_ids], PRODUCT_LIST_VERSION)
+
+
+def bump_catalog():
+    """Invalidates every cached catalog payload, for bulk updates that skip signals."""
+    bump_versions(CATALOG_VERSION)
+
+
+def request_cache_key(request):
+    """Identifies the response for request: path, query string and host (image URLs are absolute)."""
+    return f'{request.get_host()}{request.get_full_path()}'
+
+
+def cached_payload(key, versions, build):
+    """
+    Returns the payload for key from the cache, calling build() on a miss.
+    Only one caller rebuilds a missing entry; concurrent callers wait for it
+    (up to CATALOG_CACHE_LOCK_TIMEOUT) before building it themselves.
+    """
+    version_keys = [f'catalog:v:{name}' for name in [CATALOG_VERSION, *versions]]
+    current = cache.get_many(version_keys)
+    tag = '.'.join(str(current.get(k, 0)) for k in version_keys)
+    digest = hashlib.md5(f'{key}|{tag}'.encode()).hexdigest()
+    payload_key = f'catalog:resp:{digest}'
+
+    payload = cache.get(payload_key, _MISSING)
+    if payload is not _MISSING:
+        incr_counter(STATS_HITS)
+        return payload
+
+    lock_key = f'{payload_key}:lock'
+    lock_timeout = settings.CATALOG_CACHE_LOCK_TIMEOUT
+    owns_lock = cache.add(lock_key, 1, timeout=lock_timeout)
+    if not owns_lock:
+        deadline = time.monotonic() + lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            payload = cache.get(payload_key, _MISSING)
+            if payload is not _MISSING:
+                incr_counter(STATS_HITS)
+                return payload
+
+    incr_counter(STATS_MISSES)
+    try:
+        payload = build()
+        cache.set(payload_key, payload, timeout=settings.CATALOG_CACHE_TIMEOUT)
+    finally:
+        if owns_lock:
+            cache.delete(lock_key)
+    return payload
+
+
+def cache_stats():
+    hits = cache.get(STATS_HITS, 0)
+    misses = cache.get(STATS_MISSES, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
@@ -0,0 +1,40 @@
+import hashlib
+from calendar import timegm
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+
+def conditional_get(request, validator, last_modified, build, private=False):
+    """
+    Answers a GET with 304 when the client's If-None-Match / If-Modified-Since
+    still match, without calling build(). Otherwise returns build() with
+    ETag, Last-Modified, Cache-Control and Vary headers set.
+
+    validator is any string that changes whenever the body would; callers
+    derive it (and last_modified) from a cheap metadata query.
+    """
+    etag = quote_etag(hashlib.md5(validator.encode()).hexdigest())
+    last_modified_ts = timegm(last_modified.utctimetuple()) if last_modified else None
+
+    def add_headers(response):
+        response['ETag'] = etag
+        if last_modified_ts is not None:
+            response['Last-Modified'] = http_date(last_modified_ts)
+        # Clients may keep a copy but must revalidate it before reuse
+        if private:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    headers_only = add_headers(HttpResponse())
+    conditional = get_conditional_response(request, etag, last_modified_ts, response=headers_only)
+    if conditional is not headers_only:
+        return conditional
+
+    response = build()
+    if 200 <= response.status_code < 300:
+        add_headers(response)
+    return response
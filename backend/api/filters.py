@@ -0,0 +1,160 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework import serializers
+from .serializers import _split_param
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+FALSE_VALUES = {'0', 'false', 'no'}
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise serializers.ValidationError({name: "Must be a number."})
+
+
+def _date_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise serializers.ValidationError({name: "Must be a date (YYYY-MM-DD)."})
+
+
+def parse_product_filters(params):
+    """
+    Reads the catalog filters from the query string:
+    ?category=1,2   any of these category ids
+    ?min_price= / ?max_price=
+    ?in_stock=true|false
+    ?min_rating=4   rating_avg floor
+    Returns Q objects keyed by facet so facets can leave their own filter out.
+    """
+    filters = {}
+
+    category_ids = _split_param(params.get('category'))
+    if category_ids:
+        if not all(value.isdigit() for value in category_ids):
+            raise serializers.ValidationError({'category': "Must be comma-separated category ids."})
+        filters['category'] = Q(category_id__in=[int(value) for value in category_ids])
+
+    min_price = _decimal_param(params, 'min_price')
+    max_price = _decimal_param(params, 'max_price')
+    price = Q()
+    if min_price is not None:
+        price &= Q(price__gte=min_price)
+    if max_price is not None:
+        price &= Q(price__lte=max_price)
+    if price:
+        filters['price'] = price
+
+    in_stock = (params.get('in_stock') or '').lower()
+    if in_stock in TRUE_VALUES:
+        filters['in_stock'] = Q(stock__gt=0)
+    elif in_stock in FALSE_VALUES:
+        filters['in_stock'] = Q(stock__lte=0)
+    elif in_stock:
+        raise serializers.ValidationError({'in_stock': "Must be true or false."})
+
+    min_rating = _decimal_param(params, 'min_rating')
+    if min_rating is not None:
+        filters['rating'] = Q(rating_avg__gte=min_rating)
+
+    return filters
+
+
+def filter_products(queryset, filters, exclude=()):
+    for name, condition in filters.items():
+        if name not in exclude:
+            queryset = queryset.filter(condition)
+    return queryset
+
+
+def price_buckets():
+    """[(key, low, high)] from PRODUCT_PRICE_BUCKETS; the last bucket is open-ended."""
+    bounds = [0, *settings.PRODUCT_PRICE_BUCKETS]
+    buckets = [(f'{low}-{high}', low, high) for low, high in zip(bounds, bounds[1:])]
+    buckets.append((f'{bounds[-1]}+', bounds[-1], None))
+    return buckets
+
+
+def _bucket_q(low, high):
+    condition = Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+def product_facets(queryset, filters):
+    """
+    Category and price-bucket counts for the filtered catalog, from a single
+    query grouped by category with one conditional count per price bucket.
+    Each facet ignores its own filter, so the counts show what selecting
+    another category or price band would return.
+    """
+    buckets = price_buckets()
+    price_filter = filters.get('price', Q())
+    category_filter = filters.get('category', Q())
+
+    rows = (
+        filter_products(queryset, filters, exclude=('category', 'price'))
+        .values('category_id', 'category__name')
+        .annotate(
+            matching=Count('id', filter=price_filter) if price_filter else Count('id'),
+            **{f'bucket_{index}': Count('id', filter=_bucket_q(low, high) & category_filter)
+               for index, (key, low, high) in enumerate(buckets)},
+        )
+        .order_by('category__name')
+    )
+
+    categories = []
+    bucket_counts = [0] * len(buckets)
+    for row in rows:
+        if row['matching']:
+            categories.append({'id': row['category_id'], 'name': row['category__name'], 'count': row['matching']})
+        for index in range(len(buckets)):
+            bucket_counts[index] += row[f'bucket_{index}']
+
+    return {
+        'categories': categories,
+        'price': [
+            {'key': key, 'min': low, 'max': high, 'count': count}
+            for (key, low, high), count in zip(buckets, bucket_counts)
+        ],
+    }
+
+
+def filter_orders(queryset, params):
+    """
+    Applies the admin order filters from the query string:
+    ?is_paid=true|false
+    ?status=pending,shipped   any of these statuses
+    ?date_from= / ?date_to=   creation dates, both inclusive (YYYY-MM-DD)
+    """
+    is_paid = (params.get('is_paid') or '').lower()
+    if is_paid in TRUE_VALUES:
+        queryset = queryset.filter(is_paid=True)
+    elif is_paid in FALSE_VALUES:
+        queryset = queryset.filter(is_paid=False)
+
+    statuses = _split_param(params.get('status'))
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+
+    # Ranges on created_at itself rather than its date, so they can use an index
+    date_from = _date_param(params, 'date_from')
+    if date_from is not None:
+        queryset = queryset.filter(created_at__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    date_to = _date_param(params, 'date_to')
+    if date_to is not None:
+        queryset = queryset.filter(created_at__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+    return queryset
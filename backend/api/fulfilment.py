@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models import Q
+from .models import Order
+from .notifications import queue_order_update_emails
+
+# Orders per UPDATE statement
+BULK_TRANSITION_CHUNK_SIZE = 500
+
+
+def parse_order_ref(ref):
+    """An order id (int) or tracking code (str) for one requested ref, or None if it is neither."""
+    if isinstance(ref, int) and not isinstance(ref, bool):
+        return ref
+    if isinstance(ref, str) and ref.strip():
+        return int(ref) if ref.isdigit() else ref.strip()
+    return None
+
+
+def bulk_transition(refs, new_status, changed_by=None):
+    """
+    Moves the orders in refs (ids and/or tracking codes) to new_status with
+    Order.bulk_transition_status, one chunk of BULK_TRANSITION_CHUNK_SIZE orders
+    per statement, and queues the customer emails for the orders that changed
+    in the same transaction.
+
+    Returns one result per ref, in the order of refs:
+    {"order": <ref>, "id": ..., "result": "updated" | "not_found" | "invalid_transition" | "conflict", ...}
+    """
+    if new_status not in dict(Order.STATUS_CHOICES):
+        raise ValueError(f"Invalid status '{new_status}'.")
+
+    parsed = [parse_order_ref(ref) for ref in refs]
+    order_ids = [ref for ref in parsed if isinstance(ref, int)]
+    tracking_codes = [ref for ref in parsed if isinstance(ref, str)]
+
+    found = Order.objects.filter(Q(id__in=order_ids) | Q(tracking_code__in=tracking_codes)).values_list(
+        'id', 'tracking_code', 'status'
+    )
+    by_id = {}
+    by_code = {}
+    for order_id, tracking_code, current in found:
+        by_id[order_id] = current
+        by_code[tracking_code] = order_id
+
+    requested = []
+    for ref, parsed_ref in zip(refs, parsed):
+        if isinstance(parsed_ref, int):
+            requested.append((parsed_ref, parsed_ref if parsed_ref in by_id else None))
+        else:
+            requested.append((ref if parsed_ref is None else parsed_ref, by_code.get(parsed_ref)))
+
+    target_ids = sorted({order_id for _, order_id in requested if order_id is not None})
+    changed = set()
+    for start in range(0, len(target_ids), BULK_TRANSITION_CHUNK_SIZE):
+        chunk = target_ids[start:start + BULK_TRANSITION_CHUNK_SIZE]
+        with transaction.atomic():
+            updated = Order.bulk_transition_status(chunk, new_status, changed_by=changed_by)
+            queue_order_update_emails(updated)
+        changed |= updated
+
+    results = []
+    for ref, order_id in requested:
+        if order_id is None:
+            results.append({"order": ref, "id": None, "result": "not_found"})
+        elif order_id in changed:
+            results.append({"order": ref, "id": order_id, "result": "updated", "status": new_status})
+        elif new_status not in Order.ALLOWED_TRANSITIONS.get(by_id[order_id], []):
+            results.append({
+                "order": ref, "id": order_id, "result": "invalid_transition",
+                "detail": f"Invalid status transition from '{by_id[order_id]}' to '{new_status}'.",
+            })
+        else:
+            # Allowed when read, but another writer changed the status before the UPDATE
+            results.append({"order": ref, "id": order_id, "result": "conflict"})
+    return results
@@ -0,0 +1,103 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _claim(request, key, fingerprint):
+    """Returns (record, created): the stored record for key, or a new in-flight one."""
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+    if record is not None:
+        abandoned = record.status_code is None and (
+            record.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        )
+        if record.expires_at > now and not abandoned:
+            return record, False
+        # Expired, or the first request died without recording a response: take the key over
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(
+                user=request.user,
+                key=key,
+                endpoint=request.path,
+                fingerprint=fingerprint,
+                expires_at=now + timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+            )
+        return record, True
+    except IntegrityError:
+        # A concurrent request claimed the key between the lookup and the insert
+        return IdempotencyKey.objects.get(user=request.user, key=key), False
+
+
+def idempotent(view):
+    """
+    Makes a POST view safe to retry with an Idempotency-Key header.
+
+    The first request claims the key (a committed row) before the view runs,
+    so a duplicate arriving meanwhile gets 409 instead of queueing on the same
+    row locks. Once the view returns, its response is stored and every repeat
+    within IDEMPOTENCY_KEY_TTL_HOURS gets it back without running the view.
+    Server errors release the key so the client can retry. Requests without
+    the header are unaffected.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request = next(arg for arg in args if isinstance(arg, Request))
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        record, created = _claim(request, key, fingerprint)
+        if not created:
+            if record.fingerprint != fingerprint or record.endpoint != request.path:
+                return Response({"error": f"{HEADER} was already used for a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record.status_code is None:
+                return Response({"error": "A request with this Idempotency-Key is still in progress."},
+                                status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+            replay = HttpResponse(record.response_body, status=record.status_code, content_type='application/json')
+            replay['Idempotent-Replayed'] = 'true'
+            return replay
+
+        try:
+            response = view(*args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+
+        if response.status_code >= 500 or not hasattr(response, 'data'):
+            record.delete()
+            return response
+
+        # Stored as rendered JSON so a replay is byte-for-byte the same body
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            status_code=response.status_code,
+            response_body=JSONRenderer().render(response.data).decode(),
+        )
+        return response
+
+    return wrapper
@@ -0,0 +1,94 @@
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Bounding box per variant; images are scaled down to fit, never up
+IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'product_images/variants'
+
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants')
+
+
+def variant_name(source_name, digest, variant, ext):
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    return f'{VARIANT_DIR}/{stem}-{digest}-{variant}.{ext}'
+
+
+def generate_variants(product_id, force=False):
+    """
+    Writes the resized WebP/JPEG copies of a product's image and records them in
+    Product.image_variants. File names carry a hash of the source bytes, so
+    running it again for the same image does no work.
+    """
+    from .models import Product
+    from .cache import bump_product
+
+    product = Product.objects.only('id', 'image', 'image_variants').filter(pk=product_id).first()
+    if product is None or not product.image:
+        return
+
+    source_name = product.image.name
+    if not force and product.image_variants.get('source') == source_name:
+        return
+
+    with product.image.open('rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:12]
+
+    with Image.open(io.BytesIO(data)) as original:
+        original = ImageOps.exif_transpose(original).convert('RGB')
+        variants = {'source': source_name}
+        for variant, box in IMAGE_VARIANTS.items():
+            resized = original.copy()
+            resized.thumbnail(box, Image.Resampling.LANCZOS)
+            entry = {'width': resized.width, 'height': resized.height}
+            for ext, (pil_format, options) in VARIANT_FORMATS.items():
+                name = variant_name(source_name, digest, variant, ext)
+                if not default_storage.exists(name):
+                    buffer = io.BytesIO()
+                    resized.save(buffer, pil_format, **options)
+                    name = default_storage.save(name, ContentFile(buffer.getvalue()))
+                entry[ext] = name
+            variants[variant] = entry
+
+    # Only record the variants if the image was not replaced in the meantime
+    updated = Product.objects.filter(pk=product_id, image=source_name).update(
+        image_variants=variants, updated_at=timezone.now()
+    )
+    if updated:
+        bump_product(product_id)
+
+
+def _generate_in_background(product_id):
+    try:
+        generate_variants(product_id)
+    except Exception:
+        logger.exception(f"Generating image variants failed for product {product_id}")
+    finally:
+        connection.close()
+
+
+def schedule_variants(product_id):
+    """Generates variants off the request thread (inline when IMAGE_VARIANTS_ASYNC is off)."""
+    if settings.IMAGE_VARIANTS_ASYNC:
+        _executor.submit(_generate_in_background, product_id)
+    else:
+        generate_variants(product_id)
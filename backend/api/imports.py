@@ -0,0 +1,161 @@
+import csv
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from django.db import DatabaseError, transaction
+from .cache import bump_catalog
+from .models import Category, Product
+from .search import refresh_search_vectors
+
+# Products per upsert statement (and per transaction)
+IMPORT_BATCH_SIZE = 1000
+# Errors listed in the report; later ones are only counted
+IMPORT_MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ['csv', 'ndjson']
+
+MAX_PRICE = Decimal('100000000')  # Product.price is max_digits=10, decimal_places=2
+# Columns a row may leave out or leave empty; an existing product keeps its current value for them
+OPTIONAL_FIELDS = ['description', 'stock']
+
+
+def guess_format(filename):
+    """The import format for a file name (.csv, .ndjson or .jsonl), or None."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
+
+
+def read_rows(stream, input_format):
+    """Yields one dict per product from a text stream of CSV (with a header row) or JSON Lines."""
+    if input_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                row = {'__error__': f'Invalid JSON: {e}'}
+            yield row if isinstance(row, dict) else {'__error__': 'Each line must be a JSON object.'}
+
+
+def _text(row, name):
+    value = row.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def clean_row(row, category_ids):
+    """Returns (fields, errors) for one imported row; category_ids maps category name to id."""
+    if '__error__' in row:
+        return None, {'row': row['__error__']}
+
+    fields, errors = {}, {}
+    for name, max_length in (('sku', 64), ('name', 50)):
+        value = _text(row, name)
+        if not value:
+            errors[name] = "This field is required."
+        elif len(value) > max_length:
+            errors[name] = f"Ensure this field has no more than {max_length} characters."
+        fields[name] = value
+
+    try:
+        price = Decimal(_text(row, 'price'))
+        if not price.is_finite() or price < 0 or price >= MAX_PRICE or price.as_tuple().exponent < -2:
+            raise InvalidOperation
+        fields['price'] = price
+    except InvalidOperation:
+        errors['price'] = "Must be a non-negative amount with at most 2 decimal places."
+
+    category = _text(row, 'category')
+    if category not in category_ids:
+        errors['category'] = f"Unknown category '{category}'." if category else "This field is required."
+    else:
+        fields['category_id'] = category_ids[category]
+
+    # An empty cell (a blank CSV column, null or "" in JSON) counts as a missing one
+    optional = {name: _text(row, name) for name in OPTIONAL_FIELDS}
+    if optional['description']:
+        fields['description'] = optional['description']
+    if optional['stock']:
+        if optional['stock'].isdigit():
+            fields['stock'] = int(optional['stock'])
+        else:
+            errors['stock'] = "Must be a non-negative whole number."
+
+    return fields, errors
+
+
+def _upsert(batch, category_names):
+    """Creates or updates the cleaned rows in batch (keyed by sku). Returns the number created."""
+    existing = set(Product.objects.filter(sku__in=list(batch)).values_list('sku', flat=True))
+
+    # One statement per set of optional columns present, so absent columns are left as they are
+    groups = defaultdict(list)
+    for fields in batch.values():
+        groups[tuple(name for name in OPTIONAL_FIELDS if name in fields)].append(fields)
+
+    for optional, rows in groups.items():
+        Product.objects.bulk_create(
+            [Product(**fields) for fields in rows],
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=['name', 'price', 'category', 'updated_at', *optional],
+        )
+
+    # bulk_create skips the post_save signal that maintains search_vector
+    skus_by_category = defaultdict(list)
+    for sku, fields in batch.items():
+        skus_by_category[fields['category_id']].append(sku)
+    for category_id, skus in skus_by_category.items():
+        refresh_search_vectors(Product.objects.filter(sku__in=skus), category_names[category_id])
+
+    return len(batch.keys() - existing)
+
+
+def import_products(rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Upserts products from rows (dicts with sku, name, price, category name,
+    and optionally description and stock, where an empty value keeps the
+    stored one), matching existing products by sku. Invalid rows are
+    reported and skipped; the rest are written batch_size at a time, each
+    batch in its own transaction.
+
+    Returns {"created": n, "updated": n, "failed": n, "errors": [{"row": <1-based>, "sku": ..., "errors": {...}}]}.
+    """
+    category_ids = dict(Category.objects.values_list('name', 'id'))
+    category_names = {category_id: name for name, category_id in category_ids.items()}
+    report = {'created': 0, 'updated': 0, 'failed': 0, 'errors': []}
+
+    def fail(line, sku, errors):
+        report['failed'] += 1
+        if len(report['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': line, 'sku': sku, 'errors': errors})
+
+    def flush(batch, lines):
+        try:
+            with transaction.atomic():
+                created = _upsert(batch, category_names)
+        except DatabaseError as e:
+            for sku, line in lines.items():
+                fail(line, sku, {'row': f"Batch failed: {e}"})
+            return
+        report['created'] += created
+        report['updated'] += len(batch) - created
+
+    batch, lines = {}, {}
+    for line, row in enumerate(rows, start=1):
+        fields, errors = clean_row(row, category_ids)
+        if errors:
+            fail(line, _text(row, 'sku') or None, errors)
+            continue
+        # A sku repeated within a batch: the last row wins
+        batch[fields['sku']] = fields
+        lines[fields['sku']] = line
+        if len(batch) >= batch_size:
+            flush(batch, lines)
+            batch, lines = {}, {}
+    if batch:
+        flush(batch, lines)
+
+    transaction.on_commit(bump_catalog)
+    return report
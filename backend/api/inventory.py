@@ -0,0 +1,158 @@
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+from .cache import bump_catalog, bump_products
+from .models import Product, StockReservation
+
+# Products per conditional UPDATE statement
+STOCK_UPDATE_BATCH_SIZE = 200
+# Products per UPDATE ... FROM (VALUES ...) statement in sync_stock
+STOCK_SYNC_CHUNK_SIZE = 1000
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def decrement_stock(quantities):
+    """
+    Takes quantities ({product_id: quantity}) out of stock with one
+    `UPDATE ... SET stock = stock - q WHERE stock >= q` per batch, in product id
+    order. Raises InsufficientStock if any product is short; call it inside
+    the caller's transaction so the partial batch is rolled back.
+    """
+    items = sorted(quantities.items())
+    updated_at = timezone.now()
+    for start in range(0, len(items), STOCK_UPDATE_BATCH_SIZE):
+        batch = items[start:start + STOCK_UPDATE_BATCH_SIZE]
+        updated = Product.objects.filter(
+            reduce(or_, (Q(pk=pk, stock__gte=quantity) for pk, quantity in batch))
+        ).update(
+            stock=F('stock') - Case(
+                *[When(pk=pk, then=Value(quantity)) for pk, quantity in batch],
+                output_field=IntegerField(),
+            ),
+            updated_at=updated_at,
+        )
+        if updated != len(batch):
+            raise InsufficientStock(f"Not enough stock for {len(batch) - updated} of the ordered products.")
+
+    # Queryset updates skip the signals that invalidate cached catalog payloads
+    product_ids = [pk for pk, quantity in items]
+    transaction.on_commit(lambda: bump_products(product_ids))
+
+
+def reserved_quantities(product_ids, exclude_order=None):
+    """{product_id: quantity held by unexpired reservations}, one grouped query on the (product, expires_at) index."""
+    reservations = StockReservation.objects.filter(product_id__in=product_ids, expires_at__gt=timezone.now())
+    if exclude_order is not None:
+        reservations = reservations.exclude(order=exclude_order)
+    return dict(
+        reservations.values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+
+
+def check_available(products, quantities, exclude_order=None):
+    """
+    Raises InsufficientStock unless every product in quantities has that much
+    available to sell (stock minus other unexpired reservations). products
+    maps id to Product and should be locked by the caller.
+    """
+    reserved = reserved_quantities(list(quantities), exclude_order)
+    for product_id, quantity in sorted(quantities.items()):
+        product = products[product_id]
+        available = product.stock - reserved.get(product_id, 0)
+        if available < quantity:
+            raise InsufficientStock(f"Not enough stock for product '{product.name}'. Available: {max(available, 0)}")
+
+
+def reserve_stock(order, products, quantities):
+    """Holds quantities for order for STOCK_RESERVATION_MINUTES; stock itself changes only on payment."""
+    check_available(products, quantities)
+    expires_at = timezone.now() + timedelta(minutes=settings.STOCK_RESERVATION_MINUTES)
+    StockReservation.objects.bulk_create([
+        StockReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in sorted(quantities.items())
+    ])
+
+
+def convert_reservations(order):
+    """
+    Turns a paid order's reservations into stock decrements. Lines whose
+    reservation expired are re-checked against available stock first (locking
+    only those products). Raises InsufficientStock if they can no longer be
+    filled; call it inside the caller's transaction.
+    """
+    quantities = dict(
+        order.items.filter(product__isnull=False).values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+    held = dict(
+        order.reservations.filter(expires_at__gt=timezone.now())
+        .values('product_id').annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+    missing = {
+        product_id: quantity - held.get(product_id, 0)
+        for product_id, quantity in quantities.items()
+        if quantity > held.get(product_id, 0)
+    }
+    if missing:
+        products = Product.objects.select_for_update().order_by('id').in_bulk(list(missing))
+        check_available(products, missing, exclude_order=order)
+
+    decrement_stock(quantities)
+    order.reservations.all().delete()
+
+
+def _apply_stock_levels(levels, increment):
+    """One UPDATE ... FROM (VALUES ...) per chunk of levels; returns the ids it changed."""
+    table = Product._meta.db_table
+    # An increment may not take stock below zero; those rows are left as they are
+    new_stock, guard = ("p.stock + v.stock", "AND p.stock + v.stock >= 0") if increment else ("v.stock", "")
+    items = sorted(levels.items())
+    changed = set()
+    with connection.cursor() as cursor:
+        for start in range(0, len(items), STOCK_SYNC_CHUNK_SIZE):
+            chunk = items[start:start + STOCK_SYNC_CHUNK_SIZE]
+            values = ", ".join(["(%s::bigint, %s::integer)"] * len(chunk))
+            cursor.execute(
+                f"""
+                UPDATE {table} AS p SET stock = {new_stock}, updated_at = %s
+                FROM (VALUES {values}) AS v(id, stock)
+                WHERE p.id = v.id {guard}
+                RETURNING p.id
+                """,
+                [timezone.now(), *[value for pair in chunk for value in pair]],
+            )
+            changed.update(row[0] for row in cursor.fetchall())
+    return changed
+
+
+def sync_stock(levels=None, deltas=None):
+    """
+    Applies stock counts pushed by a warehouse: levels ({product_id: stock})
+    replace the stored stock, then deltas ({product_id: change}) are added to
+    it, all in one transaction. Only Product.stock changes; carts and
+    reservations are untouched, and nothing is applied if a statement fails.
+
+    Returns {"updated": [ids], "unmatched": [ids with no product],
+    "rejected": [ids whose delta would take stock below zero]}.
+    """
+    levels = levels or {}
+    deltas = deltas or {}
+    with transaction.atomic():
+        updated = _apply_stock_levels(levels, increment=False)
+        incremented = _apply_stock_levels(deltas, increment=True)
+        missed = (levels.keys() - updated) | (deltas.keys() - incremented)
+        existing = set(Product.objects.filter(pk__in=missed).values_list('pk', flat=True)) if missed else set()
+        # Queryset-level writes skip the signals that invalidate cached catalog payloads
+        transaction.on_commit(bump_catalog)
+
+    return {
+        "updated": sorted(updated | incremented),
+        "unmatched": sorted(missed - existing),
+        "rejected": sorted(deltas.keys() - incremented - (missed - existing)),
+    }
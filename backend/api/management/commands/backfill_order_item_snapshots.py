@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from api.models import OrderItem
+
+SNAPSHOT_FIELDS = ['product_name', 'product_thumbnail', 'category_name']
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies product name, thumbnail and category name onto order items created '
+        'before OrderItem kept a snapshot. Items whose product was deleted are left as they are.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true', help='Rewrite every snapshot, not only empty ones.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        items = OrderItem.objects.filter(product__isnull=False)
+        if not options['all']:
+            items = items.filter(product_name='')
+
+        last_id = 0
+        updated = 0
+        while True:
+            batch = list(
+                items.filter(id__gt=last_id)
+                .select_related('product__category')
+                .only(
+                    'id', *SNAPSHOT_FIELDS, 'product', 'product__name', 'product__image',
+                    'product__image_variants', 'product__category', 'product__category__name',
+                )
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            for item in batch:
+                for field, value in OrderItem.snapshot_of(item.product).items():
+                    setattr(item, field, value)
+            with transaction.atomic():
+                OrderItem.objects.bulk_update(batch, SNAPSHOT_FIELDS)
+            updated += len(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled snapshots for {updated} order items.'))
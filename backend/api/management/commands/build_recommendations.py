@@ -0,0 +1,100 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import permutations
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from api.models import Order, OrderItem, ProductRecommendation, RecommendationIndexState
+
+
+class Command(BaseCommand):
+    help = (
+        'Updates the "frequently bought together" index from paid orders. '
+        'Only orders paid since the last run are read unless --rebuild is given, '
+        'and never those paid within the last --lag seconds.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Drop the index and rebuild it from every paid order.')
+        parser.add_argument('--top', type=int, default=20, help='Neighbours kept per product.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders processed per transaction.')
+        parser.add_argument('--lag', type=int, default=settings.RECOMMENDATION_INDEX_LAG,
+                            help='Seconds a payment is left to commit before the watermark may pass it.')
+
+    def handle(self, *args, **options):
+        top_n = options['top']
+        batch_size = options['batch_size']
+
+        state, _ = RecommendationIndexState.objects.get_or_create(pk=1)
+        if options['rebuild']:
+            with transaction.atomic():
+                ProductRecommendation.objects.all().delete()
+                state.last_paid_at = None
+                state.last_order_id = 0
+                state.save()
+
+        # paid_at is stamped before the payment commits, so the newest rows may still be
+        # invisible; stopping short of them keeps the watermark from moving past one
+        settled_before = timezone.now() - timedelta(seconds=options['lag'])
+        processed = 0
+        while True:
+            orders = Order.objects.filter(is_paid=True, paid_at__isnull=False, paid_at__lt=settled_before)
+            if state.last_paid_at is not None:
+                orders = orders.filter(
+                    Q(paid_at__gt=state.last_paid_at)
+                    | Q(paid_at=state.last_paid_at, id__gt=state.last_order_id)
+                )
+            batch = list(orders.order_by('paid_at', 'id').values_list('id', 'paid_at')[:batch_size])
+            if not batch:
+                break
+
+            with transaction.atomic():
+                self._index_orders([order_id for order_id, _ in batch], top_n)
+                state.last_order_id, state.last_paid_at = batch[-1]
+                state.save()
+            processed += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {processed} paid orders.'))
+
+    def _index_orders(self, order_ids, top_n):
+        products_by_order = defaultdict(set)
+        for order_id, product_id in OrderItem.objects.filter(order_id__in=order_ids, product__isnull=False).values_list('order_id', 'product_id'):
+            products_by_order[order_id].add(product_id)
+
+        # Every ordered pair of distinct products that share an order, counted once per order
+        deltas = Counter(
+            pair
+            for product_ids in products_by_order.values()
+            for pair in permutations(product_ids, 2)
+        )
+        if not deltas:
+            return
+
+        touched = {product_id for product_id, _ in deltas}
+        existing = ProductRecommendation.objects.filter(product_id__in=touched)
+        for rec in existing.iterator():
+            key = (rec.product_id, rec.recommended_id)
+            if key in deltas:
+                deltas[key] += rec.score
+
+        ProductRecommendation.objects.bulk_create(
+            [
+                ProductRecommendation(product_id=product_id, recommended_id=other_id, score=score)
+                for (product_id, other_id), score in deltas.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'recommended'],
+            update_fields=['score'],
+            batch_size=1000,
+        )
+
+        # Keep only the strongest neighbours of each product we touched
+        for product_id in touched:
+            keep = (
+                ProductRecommendation.objects.filter(product_id=product_id)
+                .order_by('-score', 'recommended_id')
+                .values_list('id', flat=True)[:top_n]
+            )
+            ProductRecommendation.objects.filter(product_id=product_id).exclude(id__in=list(keep)).delete()
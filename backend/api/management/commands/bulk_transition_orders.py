@@ -0,0 +1,33 @@
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from api.fulfilment import bulk_transition
+from api.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves many orders to one status (e.g. a fulfilment batch to out_for_delivery). '
+        'Orders are given as ids or tracking codes, on the command line or in a file.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('status', choices=[value for value, _ in Order.STATUS_CHOICES])
+        parser.add_argument('orders', nargs='*', help='Order ids or tracking codes.')
+        parser.add_argument('--file', help='File with one order id or tracking code per line.')
+
+    def handle(self, *args, **options):
+        refs = list(options['orders'])
+        if options['file']:
+            with open(options['file']) as f:
+                refs += [line.strip() for line in f if line.strip()]
+        if not refs:
+            raise CommandError('Give order ids or tracking codes, or --file.')
+
+        results = bulk_transition(refs, options['status'])
+
+        for result in results:
+            if result['result'] != 'updated':
+                self.stdout.write(f"{result['order']}: {result['result']} {result.get('detail', '')}".rstrip())
+        counts = Counter(result['result'] for result in results)
+        summary = ', '.join(f'{count} {name}' for name, count in sorted(counts.items()))
+        self.stdout.write(self.style.SUCCESS(f'Moved orders to {options["status"]}: {summary}.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from api.images import generate_variants
+from api.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Generates thumbnail/card/detail WebP and JPEG variants for product images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate variants for every product image.')
+
+    def handle(self, *args, **options):
+        products = Product.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_variants')
+
+        done = failed = 0
+        for product in products.iterator(chunk_size=500):
+            if not options['force'] and product.image_variants.get('source') == product.image.name:
+                continue
+            try:
+                generate_variants(product.id, force=options['force'])
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'Product {product.id}: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} products ({failed} failed).'))
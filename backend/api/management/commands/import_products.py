@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.imports import IMPORT_BATCH_SIZE, IMPORT_FORMATS, guess_format, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates or updates products by sku from a CSV or JSON Lines file with '
+        'sku, name, price and category (by name) and optionally description and '
+        'stock. Bad rows are reported and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--input-format', choices=IMPORT_FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Products upserted per statement.')
+
+    def handle(self, *args, **options):
+        input_format = options['input_format'] or guess_format(options['path'])
+        if input_format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --input-format.')
+
+        with open(options['path'], encoding='utf-8-sig', newline='') as f:
+            report = import_products(read_rows(f, input_format), batch_size=options['batch_size'])
+
+        for error in report['errors']:
+            problems = '; '.join(f'{field}: {message}' for field, message in error['errors'].items())
+            self.stdout.write(f"Row {error['row']} ({error['sku'] or 'no sku'}): {problems}")
+        if report['failed'] > len(report['errors']):
+            self.stdout.write(f"... and {report['failed'] - len(report['errors'])} more rows with errors.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported products: {report['created']} created, {report['updated']} updated, {report['failed']} failed."
+        ))
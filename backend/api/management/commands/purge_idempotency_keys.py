@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Deletes Idempotency-Key records past their TTL, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Keys deleted per statement.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        cutoff = timezone.now()
+
+        purged = 0
+        while True:
+            batch = list(
+                IdempotencyKey.objects.filter(expires_at__lte=cutoff)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            deleted, _ = IdempotencyKey.objects.filter(id__in=batch).delete()
+            purged += deleted
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {purged} expired idempotency keys.'))
@@ -0,0 +1,28 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api.reporting import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the daily sales rollup behind the admin dashboard from paid orders. '
+        'Payments keep it current; run this after backfills or manual order edits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild days from this date (YYYY-MM-DD) onwards.')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"Invalid --since date '{options['since']}', expected YYYY-MM-DD.")
+
+        with transaction.atomic():
+            written = rebuild_daily_sales(since)
+
+        scope = f'since {since}' if since else 'for all days'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily sales rows {scope}.'))
@@ -0,0 +1,65 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from api.cache import bump_catalog
+from api.models import Product, Review
+
+RATING_FIELDS = [
+    'rating_count', 'rating_sum', 'rating_avg',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+]
+
+
+def _summary(row):
+    if row is None:
+        # Products without reviews simply go back to zero
+        return {field: 0 for field in RATING_FIELDS}
+    return {
+        'rating_count': row['count'],
+        'rating_sum': row['total'],
+        'rating_avg': (Decimal(row['total']) / row['count']).quantize(Decimal('0.01')),
+        **{f'rating_{n}_count': row[f'stars_{n}'] for n in range(1, 6)},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized rating summary on every Product from the Review table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        updated = 0
+        last_id = 0
+        while True:
+            # One transaction per batch, so only batch_size product rows are locked at a time
+            with transaction.atomic():
+                ids = list(
+                    Product.objects.filter(pk__gt=last_id).order_by('pk')
+                    .select_for_update().values_list('pk', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                summaries = {
+                    row['product_id']: row
+                    for row in Review.objects.filter(product_id__in=ids).values('product_id').annotate(
+                        count=Count('id'),
+                        total=Sum('rating'),
+                        **{f'stars_{n}': Count('id', filter=Q(rating=n)) for n in range(1, 6)},
+                    ).order_by()
+                }
+                # updated_at feeds the product ETags, so clients revalidate onto the new ratings
+                now = timezone.now()
+                Product.objects.bulk_update(
+                    [Product(pk=pk, updated_at=now, **_summary(summaries.get(pk))) for pk in ids],
+                    [*RATING_FIELDS, 'updated_at'],
+                )
+            updated += len(ids)
+            last_id = ids[-1]
+
+        bump_catalog()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating summaries for {updated} products.'))
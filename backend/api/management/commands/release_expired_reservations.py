@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from api.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes expired stock reservations in batches. Expired rows already stop '
+        'counting against available stock; this keeps the reservation table small.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Reservations deleted per statement.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        cutoff = timezone.now()
+
+        released = 0
+        while True:
+            batch = list(
+                StockReservation.objects.filter(expires_at__lte=cutoff)
+                .order_by('expires_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            deleted, _ = StockReservation.objects.filter(id__in=batch).delete()
+            released += deleted
+
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired stock reservations.'))
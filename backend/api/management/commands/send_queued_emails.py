@@ -0,0 +1,88 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from api.models import EmailOutbox
+
+# How long a claimed batch is hidden from other workers while it is being sent
+CLAIM_SECONDS = 300
+
+
+class Command(BaseCommand):
+    help = (
+        'Delivers queued emails from the outbox in batches over one SMTP connection. '
+        'Failures are retried with exponential backoff and dead-lettered after '
+        'EMAIL_OUTBOX_MAX_ATTEMPTS. Exits when nothing is due.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def claim_batch(self, batch_size):
+        """Takes due messages no other worker holds and pushes their next attempt past the claim window."""
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status=EmailOutbox.PENDING, next_attempt_at__lte=now)
+                .order_by('next_attempt_at', 'id')[:batch_size]
+            )
+            if batch:
+                EmailOutbox.objects.filter(id__in=[message.id for message in batch]).update(
+                    next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS)
+                )
+        return batch
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_attempts = settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+        retry_seconds = settings.EMAIL_OUTBOX_RETRY_SECONDS
+        counts = {EmailOutbox.SENT: 0, EmailOutbox.PENDING: 0, EmailOutbox.DEAD: 0}
+
+        # One SMTP session for the whole run instead of a connect per message
+        connection = get_connection(fail_silently=False)
+        connection.open()
+        try:
+            while True:
+                batch = self.claim_batch(batch_size)
+                if not batch:
+                    break
+
+                for message in batch:
+                    message.attempts += 1
+                    try:
+                        EmailMessage(
+                            message.subject, message.body, settings.EMAIL_HOST_USER, [message.recipient],
+                            connection=connection,
+                        ).send()
+                    except Exception as e:
+                        message.last_error = str(e)
+                        if message.attempts >= max_attempts:
+                            message.status = EmailOutbox.DEAD
+                        else:
+                            delay = retry_seconds * 2 ** (message.attempts - 1)
+                            message.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+                        # The server may have dropped us; reconnect for the next message
+                        connection.close()
+                        try:
+                            connection.open()
+                        except Exception:
+                            pass  # the next send opens a session itself and records its own failure
+                    else:
+                        message.status = EmailOutbox.SENT
+                        message.sent_at = timezone.now()
+                        message.last_error = ''
+                    counts[message.status] += 1
+
+                EmailOutbox.objects.bulk_update(
+                    batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+                )
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {counts[EmailOutbox.SENT]} emails, {counts[EmailOutbox.PENDING]} to retry, "
+            f"{counts[EmailOutbox.DEAD]} dead-lettered."
+        ))
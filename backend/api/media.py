@@ -0,0 +1,150 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views.decorators.http import require_safe
+
+# Derivatives written by api.images carry a hash of their content in the name
+HASHED_NAME = re.compile(r'-[0-9a-f]{12}-[a-z]+\.\w+$')
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _file_chunks(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header; a malformed q-value counts as 0."""
+    accepted = {}
+    for part in header.split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted
+
+
+def _preferred_encodings(header):
+    """The PRECOMPRESSED entries the client accepts (q > 0, directly or through *), best q first."""
+    accepted = _accepted_encodings(header)
+    ranked = sorted(
+        ((accepted.get(encoding, accepted.get('*', 0)), encoding, suffix) for encoding, suffix in PRECOMPRESSED),
+        key=lambda entry: -entry[0],  # stable, so equal q-values keep the PRECOMPRESSED order
+    )
+    return [(encoding, suffix) for quality, encoding, suffix in ranked if quality > 0]
+
+
+def _parse_range(header, size):
+    """Returns (start, end) for a single satisfiable byte range, None to ignore it, or False if unsatisfiable."""
+    match = RANGE_HEADER.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None  # multi-range and malformed headers get the full body
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serves uploaded media with strong ETags, long-lived caching for
+    content-hashed names and single byte-range support. A precompressed
+    sibling (file.svg.br / file.svg.gz) is served to clients that accept it,
+    as its own representation: its ETag carries the encoding and ranges
+    apply to its bytes. With MEDIA_ACCEL_REDIRECT_PREFIX set, the bytes are
+    handed to the front-end server (nginx X-Accel-Redirect) so no Python
+    worker streams them.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except Exception:
+        raise Http404("Invalid media path")
+    if not os.path.isfile(full_path):
+        raise Http404("Media file not found")
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    serve_path, response_encoding = full_path, None
+    if not settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        for encoding, suffix in _preferred_encodings(request.headers.get('Accept-Encoding', '')):
+            if os.path.isfile(full_path + suffix):
+                serve_path, response_encoding = full_path + suffix, encoding
+                break
+
+    stat = os.stat(serve_path)
+    etag = f'{stat.st_size:x}-{stat.st_mtime_ns:x}'
+    etag = quote_etag(f'{etag}-{response_encoding}' if response_encoding else etag)
+
+    def add_headers(response):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+        if response_encoding and response.status_code in (200, 206):
+            response['Content-Encoding'] = response_encoding
+        # Caches must key on Accept-Encoding for every answer, 304s and ranges included
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if HASHED_NAME.search(path):
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+        return response
+
+    headers_only = add_headers(HttpResponse())
+    conditional = get_conditional_response(request, etag, int(stat.st_mtime), response=headers_only)
+    if conditional is not headers_only:
+        return conditional
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + path.lstrip('/')
+        return add_headers(response)
+
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or etag in parse_etags(if_range)):
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return add_headers(response)
+
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = StreamingHttpResponse(_file_chunks(serve_path, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = str(length)
+        return add_headers(response)
+
+    response = StreamingHttpResponse(_file_chunks(serve_path, 0, stat.st_size), content_type=content_type)
+    response['Content-Length'] = str(stat.st_size)
+    return add_headers(response)
@@ -1,25 +1,23 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+
 class DevMediaCORSHeadersMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.media_url = settings.MEDIA_URL
+        self.allowed_origins = frozenset(settings.MEDIA_CORS_ALLOWED_ORIGINS)
 
     def __call__(self, request):
         response = self.get_response(request)
 
-        # Apply CORS headers to media files only in development
-        if request.path.startswith("/media/"):
+        # Apply CORS headers to media files for the configured origins
+        if request.path.startswith(self.media_url):
             origin = request.headers.get("Origin")
-            allowed_origins = [
-                "http://localhost:3000",
-                "http://127.0.0.1:3000",
-                "http://localhost:3001",
-                "http://127.0.0.1:3001",
-            ]
-
-            if origin in allowed_origins:
+            if origin in self.allowed_origins:
                 response["Access-Control-Allow-Origin"] = origin
                 response["Access-Control-Allow-Credentials"] = "true"
-        
-        if request.path.startswith("/media/"):
-            print(f"Adding CORS headers for media: {request.path}")
+            # Shared caches must not hand one origin's response to another
+            patch_vary_headers(response, ["Origin"])
 
         return response
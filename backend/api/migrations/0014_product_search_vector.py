@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 19:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+
+def populate_search_vectors(apps, schema_editor):
+    Category = apps.get_model('api', 'Category')
+    Product = apps.get_model('api', 'Product')
+    for category in Category.objects.all():
+        Product.objects.filter(category=category).update(search_vector=(
+            SearchVector('name', weight='A', config='english')
+            + SearchVector(Value(category.name), weight='B', config='english')
+            + SearchVector('description', weight='C', config='english')
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_product_rating_summary'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
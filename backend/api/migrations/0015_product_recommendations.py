@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-18 19:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_paid_at(apps, schema_editor):
+    # Orders paid before paid_at existed: created_at is the closest known time
+    Order = apps.get_model('api', 'Order')
+    Order.objects.filter(is_paid=True, paid_at__isnull=True).update(paid_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationIndexState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_paid_at', models.DateTimeField(blank=True, null=True)),
+                ('last_order_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ProductRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='api.product')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', '-score'], name='recommendation_score_idx')],
+                'unique_together': {('product', 'recommended')},
+            },
+        ),
+        migrations.RunPython(backfill_paid_at, migrations.RunPython.noop),
+    ]
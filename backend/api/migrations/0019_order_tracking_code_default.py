@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+# Tracking codes keep the TRK000123 shape. The sequence starts after the highest
+# existing order id, so it never repeats a code written by the old pk-based scheme.
+CREATE_TRACKING_CODE_FUNCTION = """
+CREATE SEQUENCE api_order_tracking_seq;
+SELECT setval('api_order_tracking_seq', COALESCE((SELECT MAX(id) FROM api_order), 0) + 1, false);
+CREATE FUNCTION api_next_tracking_code() RETURNS varchar LANGUAGE sql VOLATILE AS $$
+    SELECT 'TRK' || CASE WHEN n < 1000000 THEN lpad(n::text, 6, '0') ELSE n::text END
+    FROM (SELECT nextval('api_order_tracking_seq') AS n) AS next_value
+$$;
+"""
+
+DROP_TRACKING_CODE_FUNCTION = """
+DROP FUNCTION api_next_tracking_code();
+DROP SEQUENCE api_order_tracking_seq;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_product_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRACKING_CODE_FUNCTION, DROP_TRACKING_CODE_FUNCTION),
+        migrations.AlterField(
+            model_name='order',
+            name='tracking_code',
+            field=models.CharField(blank=True, db_default=models.Func(function='api_next_tracking_code', output_field=models.CharField()), max_length=20, null=True, unique=True),
+        ),
+    ]
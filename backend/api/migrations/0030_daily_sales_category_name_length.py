@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_order_item_category_name_length'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dailysales',
+            name='category_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
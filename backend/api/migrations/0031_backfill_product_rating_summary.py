@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 20:44
+
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+RATING_FIELDS = [
+    'rating_count', 'rating_sum', 'rating_avg',
+    'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+]
+
+
+def populate_rating_summaries(apps, schema_editor):
+    # 0013 added the summary at zero; reviews written before it must be counted, or
+    # the first delete or edit takes a count below zero and fails its check constraint
+    Product = apps.get_model('api', 'Product')
+    Review = apps.get_model('api', 'Review')
+    summaries = (
+        Review.objects.values('product_id')
+        .annotate(
+            count=Count('id'),
+            total=Sum('rating'),
+            **{f'stars_{n}': Count('id', filter=Q(rating=n)) for n in range(1, 6)},
+        )
+        .order_by('product_id')
+    )
+    batch = []
+    for row in summaries.iterator(chunk_size=1000):
+        batch.append(Product(
+            pk=row['product_id'],
+            rating_count=row['count'],
+            rating_sum=row['total'],
+            rating_avg=(Decimal(row['total']) / row['count']).quantize(Decimal('0.01')),
+            **{f'rating_{n}_count': row[f'stars_{n}'] for n in range(1, 6)},
+        ))
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, RATING_FIELDS)
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, RATING_FIELDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_daily_sales_category_name_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_rating_summaries, migrations.RunPython.noop),
+    ]
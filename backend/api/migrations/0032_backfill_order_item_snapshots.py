@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 20:47
+
+from django.db import migrations
+
+
+def populate_order_item_snapshots(apps, schema_editor):
+    # 0024 added the snapshot columns empty; order history renders them, so copy them
+    # from the products still linked, as OrderItem.snapshot_of does, in one statement
+    OrderItem = apps.get_model('api', 'OrderItem')
+    Product = apps.get_model('api', 'Product')
+    Category = apps.get_model('api', 'Category')
+    schema_editor.execute(f"""
+        UPDATE {OrderItem._meta.db_table} AS i SET
+            product_name = p.name,
+            category_name = COALESCE(c.name, ''),
+            product_thumbnail = COALESCE(
+                NULLIF(CASE WHEN p.image_variants ->> 'source' = p.image
+                            THEN p.image_variants -> 'thumbnail' ->> 'webp' END, ''),
+                p.image, ''
+            )
+        FROM {Product._meta.db_table} AS p
+        LEFT JOIN {Category._meta.db_table} AS c ON c.id = p.category_id
+        WHERE i.product_id = p.id AND i.product_name = ''
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_backfill_product_rating_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_order_item_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+from django.db import models, connection
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
 from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import F, Case, When, Value, Func
+from django.db.models.functions import Cast
 
 #Custom user model
 class User(AbstractUser):
@@ -23,23 +29,86 @@ class Category(models.Model):
 #Product Model
 class Product(models.Model):
     name = models.CharField(max_length=50, db_index=True)
+    # Stock keeping unit; the key bulk imports (api.imports) match products on
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, db_index=True)
     stock = models.IntegerField(default=0)
     image = models.ImageField(upload_to='product_images/', blank = True, null= True)
+    # Resized WebP/JPEG copies of image, written by api.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(Category, null=False, blank=False, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Denormalized review summary, kept in step with Review writes
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+
+    # Weighted name/category/description document, maintained by api.signals
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination orderings (see api.pagination)
+            models.Index(fields=['-created_at', '-id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            # Category facet filter combined with each ?sort= ordering
+            models.Index(fields=['category', '-created_at', '-id'], name='product_cat_created_idx'),
+            models.Index(fields=['category', 'price', 'id'], name='product_cat_price_idx'),
+            # Full-text search and the trigram typo fallback (see api.search)
+            GinIndex(fields=['search_vector'], name='product_search_idx'),
+            GinIndex(fields=['name'], name='product_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return self.name
+
+    def update_rating_summary(self, added=None, removed=None):
+        """
+        Applies one review change (a new rating, a removed rating, or both for
+        an edit) to the stored summary in a single UPDATE. Call it inside the
+        same transaction as the Review write.
+        """
+        deltas = {}
+        if added is not None:
+            deltas[f'rating_{added}_count'] = deltas.get(f'rating_{added}_count', 0) + 1
+        if removed is not None:
+            deltas[f'rating_{removed}_count'] = deltas.get(f'rating_{removed}_count', 0) - 1
+
+        count_delta = (added is not None) - (removed is not None)
+        sum_delta = (added or 0) - (removed or 0)
+
+        new_count = F('rating_count') + count_delta
+        new_sum = F('rating_sum') + sum_delta
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        updates.update(
+            updated_at=timezone.now(),
+            rating_count=new_count,
+            rating_sum=new_sum,
+            rating_avg=Case(
+                When(rating_count__lte=-count_delta, then=Value(0)),
+                default=Cast(new_sum, models.DecimalField(max_digits=12, decimal_places=4))
+                / Cast(new_count, models.DecimalField(max_digits=12, decimal_places=4)),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+        )
+        Product.objects.filter(pk=self.pk).update(**updates)
     
 #Review model    
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    rating = models.IntegerField()  # e.g. 1 to 5
+    rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('product', 'user')  # one review per user per product
@@ -47,6 +116,14 @@ class Review(models.Model):
     def __str__(self):
         return f'{self.user.username} review on {self.product.name}'
 
+class OrderStatusConflict(Exception):
+    """The order's status changed since it was read, so the transition was not applied."""
+
+    def __init__(self, order_id, expected_status):
+        self.order_id = order_id
+        self.expected_status = expected_status
+        super().__init__(f"Order {order_id} is no longer '{expected_status}'.")
+
 #Order model
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -64,46 +141,147 @@ class Order(models.Model):
     city = models.CharField(max_length=50, default="kathmandu")
     shipping_cost = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    tracking_code = models.CharField(max_length=20, unique=True, null=True, blank=True)
+    # Filled in by the INSERT itself from api_order_tracking_seq (see migration 0019)
+    tracking_code = models.CharField(
+        max_length=20, unique=True, null=True, blank=True,
+        db_default=Func(function='api_next_tracking_code', output_field=models.CharField()),
+    )
     is_paid = models.BooleanField(default=False)  # New field to track payment status
+    paid_at = models.DateTimeField(null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # "My orders" and the admin order filters, in keyset order (see api.pagination)
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['is_paid', 'status', '-created_at', '-id'], name='order_paid_status_idx'),
+            # Sales reports: paid orders in a created_at range (see api.reporting)
+            models.Index(fields=['is_paid', 'created_at'], name='order_paid_created_idx'),
+        ]
 
     def calculate_shipping_cost(self):
         if self.city.lower() not in self.ALLOWED_CITIES:
             return None
         return 0 if self.total_price >= 15000 else 100
 
+    ALLOWED_TRANSITIONS = {
+        "pending": ["shipped"],
+        "shipped": ["out_for_delivery"],
+        "out_for_delivery": ["delivered"],
+        "delivered": [],  # final state
+    }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so clean() can validate transitions without re-fetching
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
     def clean(self):
         # Validate sequential status update
         if self.pk:  # only on updates, not on new objects
-            old_status = Order.objects.get(pk=self.pk).status
-            allowed_transitions = {
-                "pending": ["shipped"],
-                "shipped": ["out_for_delivery"],
-                "out_for_delivery": ["delivered"],
-                "delivered": [],  # final state
-            }
+            old_status = getattr(self, '_loaded_status', None)
+            if old_status is None:
+                old_status = Order.objects.filter(pk=self.pk).values_list('status', flat=True).first()
             if self.status != old_status:
-                if self.status not in allowed_transitions.get(old_status, []):
+                if self.status not in self.ALLOWED_TRANSITIONS.get(old_status, []):
                     raise ValidationError(
                         f"Invalid status transition from '{old_status}' to '{self.status}'."
                     )
 
-    def save(self, *args, **kwargs):
-        is_new = self.pk is None  # Detect new order before saving
+    def transition_status(self, new_status, changed_by=None, expected_status=None, **fields):
+        """
+        Moves the order to new_status with a compare-and-set
+        `UPDATE ... WHERE id = ? AND status = <expected>` and records the change in
+        OrderStatusHistory, both in one statement. expected_status defaults to
+        the status this instance was loaded with. Extra field values (e.g.
+        is_paid) are written by the same UPDATE.
+
+        Raises ValidationError for a transition ALLOWED_TRANSITIONS does not permit
+        and OrderStatusConflict when another writer changed the status first.
+        """
+        if expected_status is None:
+            expected_status = getattr(self, '_loaded_status', None) or self.status
+        if new_status not in self.ALLOWED_TRANSITIONS.get(expected_status, []):
+            raise ValidationError(f"Invalid status transition from '{expected_status}' to '{new_status}'.")
+
+        changed_at = timezone.now()
+        fields = {'status': new_status, 'updated_at': changed_at, **fields}
+        assignments = []
+        params = []
+        for name, value in fields.items():
+            field = self._meta.get_field(name)
+            assignments.append(f'{connection.ops.quote_name(field.column)} = %s')
+            params.append(field.get_db_prep_save(value, connection))
 
+        history = OrderStatusHistory._meta.db_table
+        sql = f"""
+            WITH changed AS (
+                UPDATE {self._meta.db_table} SET {', '.join(assignments)}
+                WHERE id = %s AND status = %s
+                RETURNING id
+            )
+            INSERT INTO {history} (order_id, from_status, to_status, changed_by_id, created_at)
+            SELECT id, %s, %s, %s, %s FROM changed
+            RETURNING id
+        """
+        params += [self.pk, expected_status, expected_status, new_status,
+                   changed_by.pk if changed_by else None, changed_at]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            if cursor.fetchone() is None:
+                raise OrderStatusConflict(self.pk, expected_status)
+
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self._loaded_status = new_status
+
+    @classmethod
+    def bulk_transition_status(cls, order_ids, new_status, changed_by=None):
+        """
+        Moves every order in order_ids whose current status may go to new_status
+        (per ALLOWED_TRANSITIONS, checked in the WHERE clause) and records history
+        for each, in one statement. Returns the ids that changed.
+        """
+        sources = [status for status, targets in cls.ALLOWED_TRANSITIONS.items() if new_status in targets]
+        if not order_ids or not sources:
+            return set()
+
+        changed_at = timezone.now()
+        table = cls._meta.db_table
+        history = OrderStatusHistory._meta.db_table
+        # The self-join reads each row as it was before the UPDATE, which gives the old status
+        sql = f"""
+            WITH changed AS (
+                UPDATE {table} AS o SET status = %s, updated_at = %s
+                FROM {table} AS previous
+                WHERE o.id = previous.id AND o.id = ANY(%s) AND o.status = ANY(%s)
+                RETURNING o.id, previous.status AS from_status
+            )
+            INSERT INTO {history} (order_id, from_status, to_status, changed_by_id, created_at)
+            SELECT id, from_status, %s, %s, %s FROM changed
+            RETURNING order_id
+        """
+        params = [new_status, changed_at, list(order_ids), sources,
+                  new_status, changed_by.pk if changed_by else None, changed_at]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    def save(self, *args, **kwargs):
         shipping_fee = self.calculate_shipping_cost()
         if shipping_fee is None:
             raise ValueError("Shipping is only available in Kathmandu, Bhaktapur, and Lalitpur.")
         self.shipping_cost = shipping_fee
-        
-        self.full_clean()  # Calls clean(), so validation is done before saving
 
-        super().save(*args, **kwargs)  # Save the instance
+        # Calls clean(), so validation is done before saving. The user foreign key and
+        # the unique tracking_code are enforced by the database, so skip their SELECTs.
+        self.full_clean(exclude=['user'], validate_unique=False, validate_constraints=False)
 
-        if is_new and not self.tracking_code:
-            self.tracking_code = f"TRK{self.pk:06d}"
-            Order.objects.filter(pk=self.pk).update(tracking_code=self.tracking_code)
+        super().save(*args, **kwargs)  # Single INSERT/UPDATE; a new row gets its tracking_code back via RETURNING
+        self._loaded_status = self.status
 
     def __str__(self):
         return f"Order {self.tracking_code or 'Pending'} by {self.user.username} - {self.status} - Paid: {self.is_paid}"
@@ -117,11 +295,159 @@ class Cart(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in {self.user.username}'s cart"
     
+class OrderStatusHistory(models.Model):
+    """One row per status change made through Order.transition_status."""
+    order = models.ForeignKey(Order, related_name="status_history", on_delete=models.CASCADE)
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    changed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='order_status_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id}: {self.from_status} -> {self.to_status}"
+
+# Stock held for an unpaid order until expires_at (see api.inventory)
+class StockReservation(models.Model):
+    order = models.ForeignKey(Order, related_name="reservations", on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name="reservations", on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Reserved quantity per product (available-to-sell) and the expiry sweep
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held for order {self.order_id} until {self.expires_at}"
+
+# Stored outcome of a POST sent with an Idempotency-Key header (see api.idempotency)
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    endpoint = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)  # null while in flight
+    response_body = models.TextField(blank=True)  # rendered JSON, replayed verbatim
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.endpoint})"
+
+# Transactional email, written with the change that triggers it and sent by the send_queued_emails command
+class EmailOutbox(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'  # gave up after EMAIL_OUTBOX_MAX_ATTEMPTS
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENT, 'Sent'), (DEAD, 'Dead')]
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "due messages" scan
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.recipient} ({self.status})"
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name="items", on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Deleting a product keeps order history; the line still has its snapshot below
+    product = models.ForeignKey(Product, null=True, on_delete=models.SET_NULL)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    # Snapshot of the product when it was bought, so orders render without the catalog
+    product_name = models.CharField(max_length=100, blank=True, default='')
+    product_thumbnail = models.CharField(max_length=255, blank=True, default='')  # storage path
+    category_name = models.CharField(max_length=100, blank=True, default='')
+
+    @staticmethod
+    def snapshot_of(product):
+        """The snapshot fields for product (its category must be loaded or loadable)."""
+        variants = product.image_variants or {}
+        thumbnail = None
+        if product.image and variants.get('source') == product.image.name:
+            thumbnail = variants['thumbnail']['webp']
+        return {
+            'product_name': product.name,
+            'product_thumbnail': thumbnail or product.image.name or '',
+            'category_name': product.category.name,
+        }
+
+    @classmethod
+    def for_product(cls, order, product, quantity):
+        """An unsaved line for product at its current price, with the snapshot filled in."""
+        return cls(order=order, product=product, quantity=quantity, price=product.price, **cls.snapshot_of(product))
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} (Order {self.order_id})"
+
+#Frequently-bought-together index, built by the build_recommendations command
+class ProductRecommendation(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    score = models.PositiveIntegerField(default=0)  # number of paid orders containing both
+
+    class Meta:
+        unique_together = ('product', 'recommended')
+        indexes = [
+            models.Index(fields=['product', '-score'], name='recommendation_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.product_id} -> {self.recommended_id} ({self.score})'
+
+
+class RecommendationIndexState(models.Model):
+    """Single row holding the high-water mark of paid orders already indexed."""
+    last_paid_at = models.DateTimeField(null=True, blank=True)
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+#Paid sales rolled up per day, product and category for the admin dashboard (see api.reporting)
+class DailySales(models.Model):
+    date = models.DateField()  # the order's creation date
+    product = models.ForeignKey(Product, null=True, on_delete=models.SET_NULL, related_name='+')
+    product_name = models.CharField(max_length=100)
+    category_name = models.CharField(max_length=100, blank=True, default='')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Keyed like the order item snapshot, so deleted products keep their history
+            models.UniqueConstraint(fields=['date', 'product_name', 'category_name'], name='daily_sales_key'),
+        ]
+
     def __str__(self):
-        return f"{self.quantity} x {self.product.name} (Order {self.order.id})"
\ No newline at end of file
+        return f'{self.date} {self.product_name}: {self.units} units, {self.revenue}'
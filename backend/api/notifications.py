@@ -0,0 +1,22 @@
+from .models import EmailOutbox, Order
+
+
+def order_update_email(order):
+    subject = f"Order Update: {order.tracking_code}"
+    message = f"Your order {order.tracking_code} is now {order.status}."
+    return EmailOutbox(recipient=order.user.email, subject=subject, body=message)
+
+
+def queue_order_update_email(order):
+    """
+    Queues the status email for order in the outbox. Call it in the same
+    transaction as the status change so the email exists exactly when the
+    change does; the send_queued_emails command delivers it.
+    """
+    order_update_email(order).save()
+
+
+def queue_order_update_emails(order_ids):
+    """queue_order_update_email for many orders: one read and one bulk insert."""
+    orders = Order.objects.filter(id__in=list(order_ids)).select_related('user')
+    EmailOutbox.objects.bulk_create([order_update_email(order) for order in orders])
@@ -0,0 +1,132 @@
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.db.models.fields.tuple_lookups import Tuple, TupleGreaterThan, TupleLessThan
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination whose cursor holds every ordering column, not just the
+    first. Pages are cut with a row-value comparison such as
+    (price, id) > (%s, %s), which walks the matching composite index, so ties
+    on the leading column need no OFFSET (and no offset_cutoff). Every
+    ordering must end in a unique column and run in a single direction.
+    Cursors never carry an offset; one that does was not issued here and is
+    rejected.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+        if offset:
+            raise NotFound(self.invalid_cursor_message)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after(queryset, ordering, current_position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+        )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position, self.previous_position = following_position, current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        # Positions are unique, so the last row shown is always a usable marker
+        position = self._get_position_from_instance(self.page[-1], self.ordering) if self.page else self.next_position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        position = self._get_position_from_instance(self.page[0], self.ordering) if self.page else self.previous_position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _after(self, queryset, ordering, position):
+        """The lookup for rows past position in ordering (which already has the cursor's direction applied)."""
+        names = [order.lstrip('-') for order in ordering]
+        try:
+            values = json.loads(position)
+            if not isinstance(values, list) or len(values) != len(names):
+                raise ValueError
+            values = [queryset.query.resolve_ref(name).output_field.to_python(value) for name, value in zip(names, values)]
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        lookup = TupleLessThan if ordering[0].startswith('-') else TupleGreaterThan
+        return lookup(Tuple(*[F(name) for name in names]), values)
+
+    def _get_position_from_instance(self, instance, ordering):
+        names = [order.lstrip('-') for order in ordering]
+        if isinstance(instance, dict):
+            values = [instance[name] for name in names]
+        else:
+            values = [getattr(instance, name) for name in names]
+        return json.dumps([str(value) for value in values])
+
+
+class ProductCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination for the product catalog.
+    The cursor encodes the (sort key, id) of the last row seen, so page 500
+    costs the same index range scan as page 1 (no OFFSET).
+    """
+    page_size = settings.PRODUCT_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.PRODUCT_MAX_PAGE_SIZE
+    ordering = ('-created_at', '-id')
+
+    # ?sort=<key>, each backed by a composite index on Product
+    orderings = {
+        'newest': ('-created_at', '-id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        return self.orderings.get(request.query_params.get('sort'), self.ordering)
+
+
+class ProductSearchCursorPagination(ProductCursorPagination):
+    """Search results are keyset-paginated on (rank, id) (see api.search.rank_products)."""
+    ordering = ('-rank', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
+class OrderCursorPagination(KeysetCursorPagination):
+    """
+    Keyset pagination for order history, newest first on (created_at, id)
+    (see the Order indexes), so orders placed in the same instant page cleanly.
+    """
+    page_size = settings.ORDER_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.ORDER_MAX_PAGE_SIZE
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,128 @@
+import logging
+import math
+import time
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from .cache import incr_counter
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker state lives in the default cache, so workers only share it when that
+# is a shared backend (Redis, Memcached); with LocMemCache each process trips on its own
+BREAKER_FAILURES = 'payments:esewa:failures'
+BREAKER_OPEN = 'payments:esewa:open'
+# Set while the breaker is tripped; once BREAKER_OPEN expires it is half-open
+BREAKER_TRIPPED = 'payments:esewa:tripped'
+# Held by the one request allowed to probe a half-open breaker
+BREAKER_PROBE = 'payments:esewa:probe'
+
+STATS_REQUESTS = 'payments:esewa:requests'
+STATS_ERRORS = 'payments:esewa:errors'
+STATS_REJECTED = 'payments:esewa:rejected'
+STATS_LATENCY_MS = 'payments:esewa:latency_ms'
+STATS_LATENCY_SUM = 'payments:esewa:latency_ms:sum'
+# Upper bounds (ms) of the verification latency histogram; the last bucket is open-ended
+LATENCY_BUCKETS = [100, 250, 500, 1000, 2500, 5000]
+
+
+class PaymentGatewayUnavailable(Exception):
+    """The gateway could not give an answer: it timed out, failed, or the breaker is open."""
+
+
+def _build_session():
+    # One keep-alive pool per process instead of a TCP and TLS handshake per verification
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.ESEWA_HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_session = _build_session()
+
+
+def _latency_bucket(elapsed_ms):
+    for bound in LATENCY_BUCKETS:
+        if elapsed_ms <= bound:
+            return f'{STATS_LATENCY_MS}:le_{bound}'
+    return f'{STATS_LATENCY_MS}:inf'
+
+
+def _record_failure(probing):
+    incr_counter(STATS_ERRORS)
+    # A failed probe opens the breaker again straight away
+    if probing or incr_counter(BREAKER_FAILURES) >= settings.ESEWA_BREAKER_THRESHOLD:
+        cache.set(BREAKER_OPEN, 1, timeout=settings.ESEWA_BREAKER_COOLDOWN)
+        cache.set(BREAKER_TRIPPED, 1, timeout=None)
+        cache.delete_many([BREAKER_FAILURES, BREAKER_PROBE])
+        logger.warning("eSewa circuit breaker opened for %ss", settings.ESEWA_BREAKER_COOLDOWN)
+
+
+def _probe_timeout():
+    # Outlives the probe's own request, so a worker that dies mid-probe only blocks the next one briefly
+    return math.ceil(settings.ESEWA_VERIFY_CONNECT_TIMEOUT + settings.ESEWA_VERIFY_READ_TIMEOUT) + 1
+
+
+def verify_esewa_payment(transaction_uuid, amount):
+    """
+    Asks eSewa whether transaction_uuid was paid in full. Returns True or
+    False for a definite answer and raises PaymentGatewayUnavailable when
+    there is none, so callers can tell a failed payment from a failed
+    gateway. Never call it while holding row locks.
+    """
+    breaker = cache.get_many([BREAKER_OPEN, BREAKER_TRIPPED])
+    probing = BREAKER_TRIPPED in breaker
+    # Half-open: only the request that wins the probe key asks the gateway, the rest are refused
+    if BREAKER_OPEN in breaker or (probing and not cache.add(BREAKER_PROBE, 1, timeout=_probe_timeout())):
+        incr_counter(STATS_REJECTED)
+        raise PaymentGatewayUnavailable("eSewa verification is temporarily unavailable.")
+
+    params = {
+        'product_code': settings.ESEWA_MERCHANT_CODE,
+        'transaction_uuid': transaction_uuid,
+        'total_amount': str(amount),
+    }
+    incr_counter(STATS_REQUESTS)
+    started = time.monotonic()
+    try:
+        response = _session.get(
+            settings.ESEWA_VERIFY_URL,
+            params=params,
+            timeout=(settings.ESEWA_VERIFY_CONNECT_TIMEOUT, settings.ESEWA_VERIFY_READ_TIMEOUT),
+        )
+        if response.status_code >= 500:
+            raise requests.HTTPError(f"eSewa returned {response.status_code}", response=response)
+        data = response.json() if response.ok else {}
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f"❌ Error during verification: {e}")
+        _record_failure(probing)
+        raise PaymentGatewayUnavailable("eSewa verification failed, try again later.") from e
+    finally:
+        elapsed_ms = int((time.monotonic() - started) * 1000)
+        incr_counter(_latency_bucket(elapsed_ms))
+        incr_counter(STATS_LATENCY_SUM, elapsed_ms)
+
+    cache.delete_many([BREAKER_FAILURES, BREAKER_TRIPPED, BREAKER_PROBE] if probing else [BREAKER_FAILURES])
+    logger.info(f"🚀 eSewa verification response JSON: {data}")
+    return data.get("status") == "COMPLETE"
+
+
+def payment_gateway_stats():
+    bucket_keys = [_latency_bucket(bound) for bound in LATENCY_BUCKETS] + [f'{STATS_LATENCY_MS}:inf']
+    keys = [STATS_REQUESTS, STATS_ERRORS, STATS_REJECTED, STATS_LATENCY_SUM, BREAKER_OPEN, *bucket_keys]
+    values = cache.get_many(keys)
+    requests_made = values.get(STATS_REQUESTS, 0)
+    errors = values.get(STATS_ERRORS, 0)
+    return {
+        "requests": requests_made,
+        "errors": errors,
+        "rejected": values.get(STATS_REJECTED, 0),
+        "error_rate": round(errors / requests_made, 4) if requests_made else None,
+        "avg_latency_ms": round(values.get(STATS_LATENCY_SUM, 0) / requests_made, 1) if requests_made else None,
+        "latency_ms_buckets": {
+            key.rsplit(':', 1)[1]: values.get(key, 0) for key in bucket_keys
+        },
+        "breaker_open": bool(values.get(BREAKER_OPEN)),
+    }
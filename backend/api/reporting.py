@@ -0,0 +1,194 @@
+from datetime import date, datetime, time, timedelta
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+from rest_framework import serializers
+from .filters import _date_param
+from .models import DailySales, Order, OrderItem
+
+REPORT_BUCKETS = ['hour', 'day', 'week', 'month']
+# Upper bound on the points in one series, gaps included
+REPORT_MAX_BUCKETS = 1000
+REPORT_DEFAULT_DAYS = 30
+
+_UPSERT = """
+    ON CONFLICT (date, product_name, category_name) DO UPDATE SET
+        units = {table}.units + EXCLUDED.units,
+        revenue = {table}.revenue + EXCLUDED.revenue,
+        order_count = {table}.order_count + EXCLUDED.order_count,
+        product_id = COALESCE(EXCLUDED.product_id, {table}.product_id)
+"""
+
+
+def record_order_sales(order):
+    """
+    Adds a newly paid order's lines to the daily sales rollup, one upsert for
+    the whole order. Call it in the transaction that marks the order paid
+    (once per order; the rollup is additive).
+    """
+    table = DailySales._meta.db_table
+    items = OrderItem._meta.db_table
+    sql = f"""
+        INSERT INTO {table} (date, product_id, product_name, category_name, units, revenue, order_count)
+        SELECT %s, MAX(product_id), product_name, category_name, SUM(quantity), SUM(price * quantity), 1
+        FROM {items}
+        WHERE order_id = %s
+        GROUP BY product_name, category_name
+    """ + _UPSERT.format(table=table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [timezone.localdate(order.created_at), order.pk])
+
+
+def rebuild_daily_sales(since=None):
+    """
+    Recomputes the rollup from paid orders, for every day or for days from
+    since (a date) onwards. Run it inside a transaction so readers never see
+    the days half-rebuilt. Returns the number of rollup rows written.
+    """
+    table = DailySales._meta.db_table
+    orders = Order._meta.db_table
+    items = OrderItem._meta.db_table
+
+    rows = DailySales.objects.all()
+    where, params = "o.is_paid", [settings.TIME_ZONE]
+    if since is not None:
+        rows = rows.filter(date__gte=since)
+        # A range on created_at itself, so the order index can be used
+        where += " AND o.created_at >= %s"
+        params.append(timezone.make_aware(datetime.combine(since, time.min)))
+    rows.delete()
+
+    sql = f"""
+        INSERT INTO {table} (date, product_id, product_name, category_name, units, revenue, order_count)
+        SELECT (o.created_at AT TIME ZONE %s)::date AS day, MAX(i.product_id), i.product_name, i.category_name,
+               SUM(i.quantity), SUM(i.price * i.quantity), COUNT(DISTINCT o.id)
+        FROM {orders} AS o
+        JOIN {items} AS i ON i.order_id = o.id
+        WHERE {where}
+        GROUP BY day, i.product_name, i.category_name
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def parse_report_range(params):
+    """
+    Reads ?date_from=&date_to= (inclusive, YYYY-MM-DD; the last
+    REPORT_DEFAULT_DAYS days by default) and ?bucket=hour|day|week|month
+    (day by default). Returns (date_from, date_to, bucket).
+    """
+    date_to = _date_param(params, 'date_to') or timezone.localdate()
+    date_from = _date_param(params, 'date_from') or date_to - timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    bucket = params.get('bucket') or 'day'
+    if bucket not in REPORT_BUCKETS:
+        raise serializers.ValidationError({'bucket': f"Must be one of {', '.join(REPORT_BUCKETS)}."})
+    if date_from > date_to:
+        raise serializers.ValidationError({'date_from': "Must not be after date_to."})
+    if _bucket_count(date_from, date_to, bucket) > REPORT_MAX_BUCKETS:
+        raise serializers.ValidationError(
+            {'bucket': f"More than {REPORT_MAX_BUCKETS} buckets; use a coarser bucket or a shorter range."}
+        )
+    return date_from, date_to, bucket
+
+
+def _bucket_count(date_from, date_to, bucket):
+    days = (date_to - date_from).days + 1
+    if bucket == 'hour':
+        return days * 24
+    if bucket == 'day':
+        return days
+    if bucket == 'week':
+        return (days + date_from.weekday() - 1) // 7 + 1
+    return (date_to.year - date_from.year) * 12 + date_to.month - date_from.month + 1
+
+
+def bucket_starts(date_from, date_to, bucket):
+    """Every bucket from the one holding date_from to the one holding date_to (naive local datetimes for hours)."""
+    if bucket == 'hour':
+        first = datetime.combine(date_from, time.min)
+        return [first + timedelta(hours=hour) for hour in range(((date_to - date_from).days + 1) * 24)]
+    if bucket == 'day':
+        return [date_from + timedelta(days=day) for day in range((date_to - date_from).days + 1)]
+    if bucket == 'week':
+        # Weeks start on Monday, like date_trunc('week')
+        first = date_from - timedelta(days=date_from.weekday())
+        return [first + timedelta(weeks=week) for week in range((date_to - first).days // 7 + 1)]
+    starts = []
+    year, month = date_from.year, date_from.month
+    while (year, month) <= (date_to.year, date_to.month):
+        starts.append(date(year, month, 1))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return starts
+
+
+def _bucket_key(value, bucket):
+    # Hour buckets come back as aware datetimes; key them on naive local time like bucket_starts
+    return timezone.localtime(value).replace(tzinfo=None) if bucket == 'hour' else value
+
+
+def sales_series(date_from, date_to, bucket):
+    """
+    Paid sales per bucket between two local dates (inclusive), with a zero
+    row for every empty bucket. Revenue and units come from the DailySales
+    rollup for day, week and month buckets and from the order lines only for
+    hours; order counts come from the (is_paid, created_at) index. Every
+    filter is a plain range on the indexed column.
+
+    Returns {"bucket": ..., "series": [{"start", "revenue", "units", "orders"}], "totals": {...}}.
+    """
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    # Trunc returns dates for day-or-coarser buckets so they match the rollup's date column
+    output_field = None if bucket == 'hour' else DateField()
+
+    orders = (
+        Order.objects.filter(is_paid=True, created_at__gte=start, created_at__lt=end)
+        .annotate(start=Trunc('created_at', bucket, output_field=output_field))
+        .values('start')
+        .annotate(orders=Count('id'))
+        .values_list('start', 'orders')
+    )
+    if bucket == 'hour':
+        sales = (
+            OrderItem.objects.filter(order__is_paid=True, order__created_at__gte=start, order__created_at__lt=end)
+            .annotate(start=Trunc('order__created_at', bucket))
+            .values('start')
+            .annotate(revenue=Sum(F('price') * F('quantity')), units=Sum('quantity'))
+            .values_list('start', 'revenue', 'units')
+        )
+    else:
+        sales = (
+            DailySales.objects.filter(date__gte=date_from, date__lte=date_to)
+            .annotate(start=Trunc('date', bucket, output_field=DateField()))
+            .values('start')
+            .annotate(total_revenue=Sum('revenue'), total_units=Sum('units'))
+            .values_list('start', 'total_revenue', 'total_units')
+        )
+
+    order_counts = {_bucket_key(key, bucket): count for key, count in orders}
+    sales_by_bucket = {_bucket_key(key, bucket): (revenue, units) for key, revenue, units in sales}
+
+    series = []
+    for bucket_start in bucket_starts(date_from, date_to, bucket):
+        revenue, units = sales_by_bucket.get(bucket_start, (0, 0))
+        series.append({
+            "start": bucket_start.isoformat(),
+            "revenue": revenue,
+            "units": units,
+            "orders": order_counts.get(bucket_start, 0),
+        })
+
+    return {
+        "bucket": bucket,
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "series": series,
+        "totals": {
+            "revenue": sum(point["revenue"] for point in series),
+            "units": sum(point["units"] for point in series),
+            "orders": sum(point["orders"] for point in series),
+        },
+    }
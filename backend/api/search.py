@@ -0,0 +1,42 @@
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = 'english'
+
+
+def product_search_vector(category_name):
+    """
+    The weighted document stored in Product.search_vector.
+    Category name is passed in as a value because UPDATE cannot join.
+    """
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Value(category_name), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(queryset, category_name):
+    """Rewrites search_vector for every product in queryset (one UPDATE)."""
+    return queryset.update(search_vector=product_search_vector(category_name))
+
+
+def rank_products(queryset, query):
+    """
+    Annotates and filters queryset with a `rank` for query, best match first.
+    Full-text matches use the GIN index on search_vector. When nothing matches
+    (usually a typo) falls back to trigram word similarity on the name, which
+    uses the trigram GIN index.
+    """
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    # rank is cast to double precision so the value round-trips exactly through the cursor
+    ranked = queryset.filter(search_vector=search_query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), search_query), FloatField())
+    )
+    if ranked.exists():
+        return ranked
+
+    return queryset.filter(name__trigram_word_similar=query).annotate(
+        rank=Cast(TrigramWordSimilarity(query, 'name'), FloatField())
+    )
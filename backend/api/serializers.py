@@ -3,6 +3,9 @@ from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import RefreshToken
 from .models import Product, Order, Cart, OrderItem
 from .models import Review, Category
+from django.db.models import Prefetch
+from django.core.files.storage import default_storage
+from .images import IMAGE_VARIANTS, VARIANT_FORMATS
 import re
 
 
@@ -85,6 +88,27 @@ class ReviewSerializer(serializers.ModelSerializer):
         validated_data['product'] = product
         return super().create(validated_data)
     
+def _split_param(value):
+    return [part.strip() for part in (value or '').split(',') if part.strip()]
+
+
+def requested_product_shape(request):
+    """
+    Reads how the client wants products shaped (on product, cart and order endpoints):
+    ?fields=id,name,price   only these product fields
+    ?view=card              the compact card fields (ProductSerializer.card_fields)
+    ?expand=reviews         embed the review list (left out by default)
+    Returns (fields or None for all, set of expanded relations).
+    """
+    if request is None:
+        return None, set()
+    params = request.query_params if hasattr(request, 'query_params') else request.GET
+    fields = _split_param(params.get('fields'))
+    if not fields and params.get('view') == 'card':
+        fields = list(ProductSerializer.card_fields)
+    return (fields or None), set(_split_param(params.get('expand')))
+
+
 #Product model serializer
 class ProductSerializer(serializers.ModelSerializer):
     price = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=False)
@@ -92,10 +116,42 @@ class ProductSerializer(serializers.ModelSerializer):
 
     image_url = serializers.SerializerMethodField()  # for frontend use
     image = serializers.ImageField(required=False, allow_null=True)  # allow uploading
+    thumbnail_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()  # for srcset
+    in_stock = serializers.SerializerMethodField()
+
+    card_fields = ['id', 'name', 'price', 'in_stock', 'thumbnail_url', 'rating_avg', 'rating_count']
+    expandable_fields = ['reviews']
+
+    # Model columns each computed field reads, so querysets can defer the rest
+    field_columns = {
+        'image_url': ['image'],
+        'thumbnail_url': ['image', 'image_variants'],
+        'image_variants': ['image', 'image_variants'],
+        'in_stock': ['stock'],
+        'reviews': [],
+    }
 
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['search_vector']
+        read_only_fields = [
+            'rating_count', 'rating_sum', 'rating_avg',
+            'rating_1_count', 'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+        ]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        wanted, expand = requested_product_shape(self.context.get('request'))
+        for name in self.expandable_fields:
+            if name not in expand:
+                fields.pop(name)
+        if wanted:
+            keep = set(wanted) | expand
+            for name in list(fields):
+                if name not in keep and not fields[name].write_only:
+                    fields.pop(name)
+        return fields
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -105,10 +161,81 @@ class ProductSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def _media_url(self, name):
+        request = self.context.get('request')
+        url = default_storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def get_thumbnail_url(self, obj):
+        variants = self.get_image_variants(obj)
+        if variants:
+            return variants['thumbnail']['webp']
+        return self.get_image_url(obj)
+
+    def get_image_variants(self, obj):
+        # Variants from an older image are not served once the image is replaced
+        if not obj.image or obj.image_variants.get('source') != obj.image.name:
+            return None
+        return {
+            variant: {
+                'width': entry['width'],
+                'height': entry['height'],
+                **{ext: self._media_url(entry[ext]) for ext in VARIANT_FORMATS},
+            }
+            for variant, entry in obj.image_variants.items()
+            if variant in IMAGE_VARIANTS
+        }
+
+    def get_in_stock(self, obj):
+        return obj.stock > 0
+
+
+def with_product_fields(queryset, request, prefix=''):
+    """
+    Restricts a queryset to the product columns the requested shape needs and
+    prefetches reviews only when they are expanded. prefix is the path to the
+    product from the queryset's model, e.g. 'product__' for Cart.
+    """
+    wanted, expand = requested_product_shape(request)
+    columns = [f.name for f in Product._meta.concrete_fields if not f.primary_key]
+    if wanted is None:
+        needed = set(columns) - {'search_vector'}
+    else:
+        needed = set()
+        for name in wanted:
+            needed.update(ProductSerializer.field_columns.get(name, [name]))
+
+    deferred = [f'{prefix}{column}' for column in columns if column not in needed]
+    queryset = queryset.defer(*deferred)
+    if 'reviews' in expand:
+        queryset = queryset.prefetch_related(
+            Prefetch(f'{prefix}reviews', queryset=Review.objects.select_related('user'))
+        )
+    return queryset
+
+
+def wants_order_snapshot(request):
+    """?view=snapshot on order endpoints: lines come from the OrderItem snapshot, not the catalog."""
+    if request is None:
+        return False
+    params = request.query_params if hasattr(request, 'query_params') else request.GET
+    return params.get('view') == 'snapshot'
+
+
+def order_items_prefetch(request):
+    """Loads order items and their products in one query, shaped like with_product_fields."""
+    if wants_order_snapshot(request):
+        return Prefetch('items', queryset=OrderItem.objects.all())
+    return Prefetch('items', queryset=with_product_fields(OrderItem.objects.select_related('product'), request, 'product__'))
+
+
+def order_serializer_class(request):
+    return OrderSnapshotSerializer if wants_order_snapshot(request) else OrderSerializer
+
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
-    product_name = serializers.CharField(source= "product.name", read_only= True)
+    product_name = serializers.CharField(read_only= True)
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(queryset= Product.objects.all(), write_only =True)
     price = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=False)  # Ensure price is a number
@@ -139,6 +266,26 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
 
 
+class OrderItemSnapshotSerializer(serializers.ModelSerializer):
+    """An order line as it was bought, rendered without reading Product or Category."""
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, coerce_to_string=False)
+    thumbnail_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderItem
+        fields = ['id', 'product_id', 'product_name', 'category_name', 'thumbnail_url', 'quantity', 'price']
+
+    def get_thumbnail_url(self, obj):
+        if not obj.product_thumbnail:
+            return None
+        request = self.context.get('request')
+        url = default_storage.url(obj.product_thumbnail)
+        return request.build_absolute_uri(url) if request is not None else url
+
+class OrderSnapshotSerializer(OrderSerializer):
+    items = OrderItemSnapshotSerializer(many=True, read_only=True)
+
+
 class CartSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only = True)
 
@@ -153,7 +300,7 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description']
 
 class AdminOrderSerializer(serializers.ModelSerializer):
-    items = OrderItemSerializer(source='order_items', many=True, read_only=True)
+    items = OrderItemSerializer(many=True, read_only=True)
     user = serializers.StringRelatedField()
 
     class Meta:
@@ -0,0 +1,52 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Product, Category, Review
+from .search import refresh_search_vectors
+from .images import schedule_variants
+from .cache import bump_product, bump_versions, CATEGORY_LIST_VERSION, PRODUCT_LIST_VERSION
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    refresh_search_vectors(Product.objects.filter(pk=instance.pk), instance.category.name)
+
+
+@receiver(post_save, sender=Product)
+def generate_product_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    if instance.image_variants.get('source') != instance.image.name:
+        product_id = instance.pk
+        transaction.on_commit(lambda: schedule_variants(product_id))
+
+
+@receiver(post_save, sender=Category)
+def update_category_search_vectors(sender, instance, created=False, raw=False, **kwargs):
+    # A renamed category changes the indexed text of all its products
+    if raw or created:
+        return
+    refresh_search_vectors(Product.objects.filter(category=instance), instance.name)
+
+
+# Versions are bumped after commit: bumping earlier would let a concurrent
+# request cache the not-yet-committed old state under the new version.
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, instance, **kwargs):
+    product_id = instance.pk
+    transaction.on_commit(lambda: bump_product(product_id))
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_reviewed_product_cache(sender, instance, **kwargs):
+    # Reviews and the rating summary are part of the product payload
+    product_id = instance.product_id
+    transaction.on_commit(lambda: bump_product(product_id))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_versions(CATEGORY_LIST_VERSION, PRODUCT_LIST_VERSION))
@@ -1,3 +1,901 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from importlib import import_module
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from django.apps import apps
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from .models import (
+    Cart, Category, DailySales, EmailOutbox, IdempotencyKey, Order, OrderItem, OrderStatusConflict, OrderStatusHistory,
+    Product, ProductRecommendation, Review, StockReservation, User,
+)
+from .filters import parse_product_filters, product_facets
+from .imports import import_products, read_rows
+from .payments import (
+    BREAKER_OPEN, BREAKER_PROBE, BREAKER_TRIPPED, PaymentGatewayUnavailable, payment_gateway_stats, verify_esewa_payment,
+)
+from .reporting import rebuild_daily_sales
 
-# Create your tests here.
+
+class SendQueuedEmailsTests(TestCase):
+    def test_sends_queued_emails_over_one_connection(self):
+        for index in range(3):
+            EmailOutbox.objects.create(recipient=f'customer{index}@example.com', subject='Order update', body='Shipped')
+
+        with mock.patch.object(EmailBackend, 'open', autospec=True, return_value=True) as open_connection:
+            call_command('send_queued_emails', stdout=mock.Mock())
+
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox),
+                         ['customer0@example.com', 'customer1@example.com', 'customer2@example.com'])
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailOutbox.SENT).exists())
+        self.assertFalse(EmailOutbox.objects.filter(sent_at__isnull=True).exists())
+
+    def test_failed_send_is_retried_later(self):
+        message = EmailOutbox.objects.create(recipient='customer@example.com', subject='Order update', body='Shipped')
+
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=OSError('connection reset')):
+            call_command('send_queued_emails', stdout=mock.Mock())
+
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.last_error), (EmailOutbox.PENDING, 1, 'connection reset'))
+        self.assertGreater(message.next_attempt_at, message.created_at)
+        self.assertEqual(mail.outbox, [])
+
+
+class OrderItemSnapshotTests(TestCase):
+    def test_long_category_name_is_copied_onto_order_lines(self):
+        category = Category.objects.create(name='c' * 100)
+        product = Product.objects.create(name='Kettle', description='Steel', price=10, stock=5, category=category)
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        Cart.objects.create(user=user, product=product, quantity=1)
+        client = APIClient()
+        client.force_authenticate(user)
+
+        response = client.post('/api/checkout/')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(OrderItem.objects.get().category_name, 'c' * 100)
+
+
+class DailySalesTests(TestCase):
+    def test_rollup_keeps_long_category_names(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        order = Order.objects.create(user=user, total_price=20, is_paid=True)
+        OrderItem.objects.create(order=order, quantity=2, price=10, product_name='Kettle', category_name='c' * 100)
+
+        rebuild_daily_sales()
+
+        row = DailySales.objects.get()
+        self.assertEqual((row.category_name, row.units, row.revenue, row.order_count), ('c' * 100, 2, 20, 1))
+
+
+class SalesReportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True)
+        self.first_day = timezone.localdate() - timedelta(days=5)
+        # Sales on the first and third days; the second and fourth stay empty
+        self.order(self.first_day, [(2, 10)])
+        self.order(self.first_day, [(1, 4)])
+        self.order(self.first_day + timedelta(days=2), [(3, 5), (1, 10)])
+        self.order(self.first_day + timedelta(days=1), [(9, 9)], is_paid=False)
+        rebuild_daily_sales()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def order(self, day, lines, is_paid=True):
+        order = Order.objects.create(user=self.admin, total_price=sum(q * p for q, p in lines), is_paid=is_paid)
+        noon = datetime(day.year, day.month, day.day, 12)
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(noon))
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, quantity=quantity, price=price, product_name=f'Item {price}', category_name='Kitchen')
+            for quantity, price in lines
+        ])
+
+    def test_daily_series_fills_empty_days_with_zeros(self):
+        response = self.client.get('/api/admin/reports/sales/', {
+            'date_from': self.first_day.isoformat(),
+            'date_to': (self.first_day + timedelta(days=3)).isoformat(),
+        })
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            [(point['start'], point['revenue'], point['units'], point['orders']) for point in response.data['series']],
+            [
+                (self.first_day.isoformat(), 24, 3, 2),
+                ((self.first_day + timedelta(days=1)).isoformat(), 0, 0, 0),
+                ((self.first_day + timedelta(days=2)).isoformat(), 25, 4, 1),
+                ((self.first_day + timedelta(days=3)).isoformat(), 0, 0, 0),
+            ],
+        )
+        self.assertEqual(response.data['totals'], {'revenue': 49, 'units': 7, 'orders': 3})
+
+    def test_hour_buckets_agree_with_the_daily_totals(self):
+        day = (self.first_day + timedelta(days=2)).isoformat()
+
+        response = self.client.get('/api/admin/reports/sales/', {'date_from': day, 'date_to': day, 'bucket': 'hour'})
+
+        series = response.data['series']
+        self.assertEqual(len(series), 24)
+        self.assertEqual([point['orders'] for point in series].count(0), 23)
+        self.assertEqual(series[12]['revenue'], 25)
+        self.assertEqual(response.data['totals'], {'revenue': 25, 'units': 4, 'orders': 1})
+
+
+class AdminDashboardTests(TestCase):
+    def test_sales_over_time_sums_paid_order_totals_with_shipping(self):
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True)
+        paid = Order.objects.create(user=admin, total_price=120, shipping_cost=100, is_paid=True)
+        OrderItem.objects.create(order=paid, quantity=2, price=10, product_name='Kettle', category_name='Kitchen')
+        Order.objects.create(user=admin, total_price=50)
+        rebuild_daily_sales()
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        response = client.get('/api/admin/dashboard/')
+
+        self.assertEqual([(point['date'], point['total_sales']) for point in response.data['sales_over_time']],
+                         [(timezone.localdate(paid.created_at), 120)])
+        self.assertEqual([(row['name'], row['sales']) for row in response.data['top_products']], [('Kettle', 20)])
+        self.assertEqual(response.data['total_orders'], 2)
+
+
+class ProductCursorTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Kitchen')
+        # Five products share a price, so a page boundary falls inside the tie
+        for index in range(7):
+            Product.objects.create(name=f'Kettle {index}', description='Steel kettle', price=10 if index < 5 else 20,
+                                   stock=5, category=self.category)
+        self.client = APIClient()
+
+    def walk(self, url, link='next'):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [product['id'] for product in response.data['results']]
+            url, pages = response.data[link], pages + 1
+        return ids, pages
+
+    def test_price_pages_visit_tied_products_once(self):
+        ids, pages = self.walk('/api/products/?sort=price&page_size=2')
+
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual((ids, pages), (expected, 4))
+
+    def test_previous_link_walks_back_through_ties(self):
+        response = self.client.get('/api/products/?sort=-price&page_size=3')
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['next'])
+        back, _ = self.walk(response.data['previous'], link='previous')
+
+        expected = list(Product.objects.order_by('-price', '-id').values_list('id', flat=True))
+        self.assertEqual(sorted(back), sorted(expected[:6]))
+
+    def test_search_pages_visit_equally_ranked_products_once(self):
+        ids, pages = self.walk('/api/products/search/?q=kettle&page_size=2')
+
+        self.assertEqual(sorted(ids), sorted(Product.objects.values_list('id', flat=True)))
+        self.assertEqual(pages, 4)
+
+    def test_tampered_cursor_is_rejected(self):
+        cursor = base64.b64encode(b'p=["oops", "1"]').decode()
+
+        response = self.client.get(f'/api/products/?sort=price&cursor={cursor}')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_offset_is_rejected(self):
+        cursor = base64.b64encode(b'o=2&p=["10", "1"]').decode()
+
+        response = self.client.get(f'/api/products/?sort=price&cursor={cursor}')
+
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderCursorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        for _ in range(5):
+            Order.objects.create(user=self.user, total_price=10)
+        # A bulk import can stamp many orders with the same instant
+        Order.objects.update(created_at=timezone.now())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, link='next'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.data)
+            ids += [order['id'] for order in response.data['results']]
+            url = response.data[link]
+        return ids
+
+    def test_pages_through_orders_with_the_same_timestamp(self):
+        expected = list(Order.objects.order_by('-id').values_list('id', flat=True))
+
+        self.assertEqual(self.walk('/api/orders/?page_size=2'), expected)
+
+    def test_previous_link_returns_to_the_first_page(self):
+        response = self.client.get('/api/orders/?page_size=2')
+        response = self.client.get(response.data['next'])
+        response = self.client.get(response.data['next'])
+
+        back = self.walk(response.data['previous'], link='previous')
+
+        expected = list(Order.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual(sorted(back), sorted(expected[:4]))
+
+
+class CheckoutStockTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Kettle', description='Steel', price=10, stock=5,
+                                              category=Category.objects.create(name='Kitchen'))
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_paid_checkout_takes_stock_once(self):
+        Cart.objects.create(user=self.user, product=self.product, quantity=2)
+
+        order_id = self.client.post('/api/checkout/').data['id']
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+        self.assertEqual(StockReservation.objects.get(order_id=order_id).quantity, 2)
+
+        with mock.patch('api.views.verify_esewa_payment', return_value=True):
+            response = self.client.post('/api/esewa/payment-confirm/', {'order_id': order_id, 'transaction_uuid': 't1'})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_checkout_cannot_take_stock_held_for_another_order(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='secret')
+        Cart.objects.create(user=other, product=self.product, quantity=4)
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        self.assertEqual(other_client.post('/api/checkout/').status_code, 201)
+        Cart.objects.create(user=self.user, product=self.product, quantity=2)
+
+        response = self.client.post('/api/checkout/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 0)
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+
+    def fill_cart(self, lines):
+        for index in range(lines):
+            product = Product.objects.create(name=f'Pan {lines}-{index}', description='Iron', price=5, stock=5,
+                                             category=self.product.category)
+            Cart.objects.create(user=self.user, product=product, quantity=1)
+
+    def test_checkout_query_count_does_not_grow_with_the_cart(self):
+        for lines in (1, 5):
+            self.fill_cart(lines)
+            # Savepoint, locked cart read, order, order items, held stock, reservations,
+            # cart delete, release, then the items for the response
+            with self.assertNumQueries(9):
+                response = self.client.post('/api/checkout/')
+            self.assertEqual(len(response.data['items']), lines)
+
+class PrecompressedMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        for name, body in (('logo.svg', b'<svg>identity</svg>'), ('logo.svg.br', b'brotli')):
+            with open(os.path.join(self.media_root, name), 'wb') as f:
+                f.write(body)
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_REDIRECT_PREFIX='')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_encodings_have_their_own_etags(self):
+        identity = self.client.get('/media/logo.svg')
+        brotli = self.client.get('/media/logo.svg', HTTP_ACCEPT_ENCODING='gzip, br')
+
+        self.assertEqual(b''.join(brotli.streaming_content), b'brotli')
+        self.assertEqual(brotli['Content-Encoding'], 'br')
+        self.assertTrue(brotli['ETag'].endswith('-br"'))
+        self.assertNotEqual(identity['ETag'], brotli['ETag'])
+
+        # The identity ETag must not validate the compressed representation, nor the reverse
+        stale = self.client.get('/media/logo.svg', HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=identity['ETag'])
+        self.assertEqual(stale.status_code, 200)
+        stale = self.client.get('/media/logo.svg', HTTP_IF_NONE_MATCH=brotli['ETag'])
+        self.assertEqual(b''.join(stale.streaming_content), b'<svg>identity</svg>')
+
+    def test_not_modified_and_partial_responses_vary_on_encoding(self):
+        etag = self.client.get('/media/logo.svg', HTTP_ACCEPT_ENCODING='br')['ETag']
+
+        not_modified = self.client.get('/media/logo.svg', HTTP_ACCEPT_ENCODING='br', HTTP_IF_NONE_MATCH=etag)
+        partial = self.client.get('/media/logo.svg', HTTP_ACCEPT_ENCODING='br', HTTP_RANGE='bytes=0-1')
+
+        self.assertEqual((not_modified.status_code, not_modified['ETag']), (304, etag))
+        self.assertIn('Accept-Encoding', not_modified['Vary'])
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(b''.join(partial.streaming_content), b'br')
+        self.assertEqual((partial['Content-Range'], partial['Content-Encoding']), ('bytes 0-1/6', 'br'))
+        self.assertIn('Accept-Encoding', partial['Vary'])
+
+    def test_refused_encodings_get_identity(self):
+        for header in ('br;q=0', 'gzip, br; q=0', 'brotli-ish', '*, br;q=0'):
+            response = self.client.get('/media/logo.svg', HTTP_ACCEPT_ENCODING=header)
+
+            self.assertEqual(b''.join(response.streaming_content), b'<svg>identity</svg>', header)
+            self.assertFalse(response.has_header('Content-Encoding'), header)
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_wildcard_and_q_values_pick_the_compressed_sibling(self):
+        with open(os.path.join(self.media_root, 'logo.svg.gz'), 'wb') as f:
+            f.write(b'gzipped')
+
+        self.assertEqual(self.client.get('/media/logo.svg', HTTP_ACCEPT_ENCODING='*')['Content-Encoding'], 'br')
+        response = self.client.get('/media/logo.svg', HTTP_ACCEPT_ENCODING='br;q=0.5, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class BuildRecommendationsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Kitchen')
+        self.kettle, self.mug, self.tea = [
+            Product.objects.create(name=name, description=name, price=10, stock=5, category=category)
+            for name in ('Kettle', 'Mug', 'Tea')
+        ]
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+
+    def paid_order(self, products, paid_ago):
+        order = Order.objects.create(user=self.user, total_price=20, is_paid=True,
+                                     paid_at=timezone.now() - timedelta(seconds=paid_ago))
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=10, product_name=product.name)
+        return order
+
+    def neighbours(self, product):
+        return set(ProductRecommendation.objects.filter(product=product).values_list('recommended__name', flat=True))
+
+    def test_recent_payments_are_left_for_a_later_run(self):
+        self.paid_order([self.kettle, self.mug], paid_ago=3600)
+        # Paid just before the run: its transaction may not have committed yet when others have
+        self.paid_order([self.kettle, self.tea], paid_ago=10)
+
+        call_command('build_recommendations', '--lag=300', stdout=mock.Mock())
+        self.assertEqual(self.neighbours(self.kettle), {'Mug'})
+
+        call_command('build_recommendations', '--lag=0', stdout=mock.Mock())
+        self.assertEqual(self.neighbours(self.kettle), {'Mug', 'Tea'})
+
+
+class FakeEsewa(BaseHTTPRequestHandler):
+    """Answers status checks with whatever the test queued in server.replies: (status code, body, delay)."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests += 1
+        code, body, delay = self.server.replies.pop(0)
+        time.sleep(delay)
+        try:
+            self.send_response(code)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out first
+
+    def log_message(self, *args):
+        pass
+
+
+class VerifyEsewaPaymentTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeEsewa)
+        self.server.replies, self.server.requests = [], 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        override = override_settings(
+            ESEWA_VERIFY_URL=f'http://127.0.0.1:{self.server.server_port}/status/',
+            ESEWA_VERIFY_READ_TIMEOUT=0.2, ESEWA_BREAKER_THRESHOLD=2, ESEWA_BREAKER_COOLDOWN=60,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def reply(self, code=200, status='COMPLETE', body=None, delay=0):
+        self.server.replies.append((code, body if body is not None else json.dumps({'status': status}).encode(), delay))
+
+    def test_answers_are_definite_and_failures_are_unavailable(self):
+        self.reply(status='COMPLETE')
+        self.reply(status='PENDING')
+        self.reply(code=404, body=b'{}')
+        self.assertTrue(verify_esewa_payment('t1', '100.00'))
+        self.assertFalse(verify_esewa_payment('t1', '100.00'))
+        self.assertFalse(verify_esewa_payment('t1', '100.00'))
+
+        for code, body, delay in ((200, b'{}', 0.5), (502, b'bad gateway', 0), (200, b'<html>', 0)):
+            cache.clear()
+            self.server.replies.append((code, body, delay))
+            with self.assertRaises(PaymentGatewayUnavailable):
+                verify_esewa_payment('t1', '100.00')
+            self.assertEqual(payment_gateway_stats()['errors'], 1)
+
+    def test_breaker_opens_half_opens_and_closes(self):
+        self.reply(code=502, body=b'')
+        self.reply(code=502, body=b'')
+        for _ in range(2):
+            with self.assertRaises(PaymentGatewayUnavailable):
+                verify_esewa_payment('t1', '100.00')
+
+        # Open: refused without a request
+        with self.assertRaises(PaymentGatewayUnavailable):
+            verify_esewa_payment('t1', '100.00')
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(payment_gateway_stats()['rejected'], 1)
+
+        # Half-open once the cooldown ends: while another worker holds the probe, still refused
+        cache.delete(BREAKER_OPEN)
+        cache.add(BREAKER_PROBE, 1)
+        with self.assertRaises(PaymentGatewayUnavailable):
+            verify_esewa_payment('t1', '100.00')
+        self.assertEqual((self.server.requests, payment_gateway_stats()['rejected']), (2, 2))
+
+        # The probe that does go out fails, which opens it again
+        cache.delete(BREAKER_PROBE)
+        self.reply(code=502, body=b'')
+        with self.assertRaises(PaymentGatewayUnavailable):
+            verify_esewa_payment('t1', '100.00')
+        self.assertTrue(payment_gateway_stats()['breaker_open'])
+
+        # Half-open again: a success closes it, and one failure no longer trips it
+        cache.delete(BREAKER_OPEN)
+        self.reply(status='COMPLETE')
+        self.reply(code=502, body=b'')
+        self.reply(status='COMPLETE')
+        self.assertTrue(verify_esewa_payment('t1', '100.00'))
+        with self.assertRaises(PaymentGatewayUnavailable):
+            verify_esewa_payment('t1', '100.00')
+        self.assertTrue(verify_esewa_payment('t1', '100.00'))
+        self.assertEqual(self.server.requests, 6)
+
+    def test_half_open_breaker_lets_one_request_probe(self):
+        cache.set(BREAKER_TRIPPED, 1)
+        # A slow probe is still waiting on the gateway when the second request arrives
+        self.reply(status='COMPLETE', delay=0.1)
+        probe = threading.Thread(target=verify_esewa_payment, args=('t1', '100.00'))
+        probe.start()
+        while not cache.get(BREAKER_PROBE):
+            time.sleep(0.01)
+
+        with self.assertRaises(PaymentGatewayUnavailable):
+            verify_esewa_payment('t2', '100.00')
+        probe.join()
+
+        self.assertEqual(self.server.requests, 1)
+        # The probe succeeded, so the breaker is closed for everyone
+        self.reply(status='COMPLETE')
+        self.assertTrue(verify_esewa_payment('t2', '100.00'))
+
+
+class OrderStatusTransitionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def order(self, order_status='pending'):
+        return Order.objects.create(user=self.admin, total_price=10, status=order_status)
+
+    def test_stale_instance_conflicts_instead_of_overwriting(self):
+        order = self.order()
+        stale = Order.objects.get(pk=order.pk)
+        order.transition_status('shipped')
+
+        with self.assertRaises(OrderStatusConflict):
+            stale.transition_status('shipped')
+
+        self.assertEqual(OrderStatusHistory.objects.filter(order=order).count(), 1)
+
+    def test_stale_expected_status_answers_409(self):
+        order = self.order('shipped')
+
+        response = self.client.patch(f'/api/admin/orders/{order.pk}/status/',
+                                     {'status': 'shipped', 'expected_status': 'pending'}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['status'], 'shipped')
+
+    def test_resending_the_current_status_is_a_no_op(self):
+        order = self.order('shipped')
+
+        response = self.client.patch(f'/api/admin/orders/{order.pk}/status/', {'status': 'shipped'}, format='json')
+
+        self.assertEqual((response.status_code, response.data['status']), (200, 'shipped'))
+        self.assertFalse(OrderStatusHistory.objects.exists())
+
+    def test_bulk_transition_skips_orders_in_another_status(self):
+        pending, shipped, delivered = self.order(), self.order('shipped'), self.order('delivered')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/admin/orders/bulk-status/', {
+                'status': 'out_for_delivery', 'orders': [pending.pk, shipped.tracking_code, delivered.pk, 999999],
+            }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([result['result'] for result in response.data['results']],
+                         ['invalid_transition', 'updated', 'invalid_transition', 'not_found'])
+        self.assertEqual([result['order'] for result in response.data['results']],
+                         [pending.pk, shipped.tracking_code, delivered.pk, 999999])
+        self.assertEqual(dict(Order.objects.values_list('pk', 'status')),
+                         {pending.pk: 'pending', shipped.pk: 'out_for_delivery', delivered.pk: 'delivered'})
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Kettle', description='Steel', price=10, stock=30,
+                                              category=Category.objects.create(name='Kitchen'))
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.body = {'shipping_address': 'Thamel', 'city': 'kathmandu',
+                     'items': [{'product_id': self.product.pk, 'quantity': 2}]}
+
+    def create_order(self, body, key='order-1'):
+        return self.client.post('/api/orders/create/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_repeat_gets_the_stored_response(self):
+        first = self.create_order(self.body)
+        repeat = self.create_order(self.body)
+
+        self.assertEqual(first.status_code, 200, first.data)
+        self.assertEqual((repeat.status_code, repeat.content), (first.status_code, first.content))
+        self.assertEqual(repeat['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_for_a_different_body_is_rejected(self):
+        self.create_order(self.body)
+
+        response = self.create_order(dict(self.body, city='lalitpur'))
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+
+
+class ProductFieldsTests(TestCase):
+    def test_image_variants_alone_loads_its_columns_up_front(self):
+        category = Category.objects.create(name='Kitchen')
+        for index in range(3):
+            Product.objects.create(name=f'Kettle {index}', description='Steel', price=10, stock=5, category=category)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(username='admin', email='admin@example.com',
+                                                           password='secret', is_staff=True))
+
+        # One query for the page; a deferred image or image_variants would cost one more per product
+        with self.assertNumQueries(1):
+            response = client.get('/api/admin/products/?fields=id,image_variants')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([set(product) for product in response.data['results']], [{'id', 'image_variants'}] * 3)
+
+
+class ProductImportTests(TestCase):
+    def test_empty_optional_cells_keep_stored_values(self):
+        category = Category.objects.create(name='Kitchen')
+        Product.objects.create(sku='K-1', name='Kettle', description='Steel', price=10, stock=5, category=category)
+        Product.objects.create(sku='K-2', name='Mug', description='Ceramic', price=4, stock=9, category=category)
+        csv_rows = read_rows(io.StringIO('sku,name,price,category,description,stock\nK-1,Kettle,12,Kitchen,,\n'), 'csv')
+        json_rows = read_rows(io.StringIO('{"sku": "K-2", "name": "Mug", "price": "5", "category": "Kitchen", '
+                                          '"description": null, "stock": ""}\n'), 'ndjson')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = import_products([*csv_rows, *json_rows])
+
+        self.assertEqual((report['updated'], report['failed']), (2, 0))
+        self.assertEqual(sorted(Product.objects.values_list('sku', 'price', 'description', 'stock')),
+                         [('K-1', 12, 'Steel', 5), ('K-2', 5, 'Ceramic', 9)])
+
+
+class RatingSummaryBackfillTests(TestCase):
+    def test_review_from_before_the_summary_can_be_deleted(self):
+        product = Product.objects.create(name='Kettle', description='Steel', price=10, stock=5,
+                                         category=Category.objects.create(name='Kitchen'))
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        # Written straight to the table, as reviews were before 0013: the summary stays at zero
+        Review.objects.create(product=product, user=user, rating=4, comment='Good')
+        Review.objects.create(product=product, rating=2, comment='Meh',
+                              user=User.objects.create_user(username='other', email='other@example.com', password='secret'))
+
+        backfill = import_module('api.migrations.0031_backfill_product_rating_summary')
+        backfill.populate_rating_summaries(apps, None)
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum, product.rating_avg, product.rating_4_count), (2, 6, 3, 1))
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.delete(f'/api/products/{product.pk}/reviews/my/')
+
+        self.assertEqual(response.status_code, 204)
+        product.refresh_from_db()
+        self.assertEqual((product.rating_count, product.rating_sum, product.rating_avg, product.rating_4_count), (1, 2, 2, 0))
+
+
+class RebuildProductRatingsTests(TestCase):
+    def test_rebuilt_ratings_change_the_product_etag_and_payload(self):
+        cache.clear()
+        category = Category.objects.create(name='Kitchen')
+        product = Product.objects.create(name='Kettle', description='Steel', price=10, stock=5, category=category)
+        unreviewed = Product.objects.create(name='Mug', description='Ceramic', price=4, stock=5, category=category,
+                                            rating_count=3, rating_sum=9, rating_avg=3, rating_3_count=3)
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        # Written straight to the table, so the stored summary is stale
+        Review.objects.create(product=product, user=user, rating=5, comment='Great')
+        Product.objects.filter(pk=product.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        client = APIClient()
+        before = client.get(f'/api/products/{product.pk}/')
+
+        call_command('rebuild_product_ratings', '--batch-size=1', stdout=mock.Mock())
+
+        after = client.get(f'/api/products/{product.pk}/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual((after.data['rating_count'], after.data['rating_avg']), (1, '5.00'))
+        unreviewed.refresh_from_db()
+        self.assertEqual((unreviewed.rating_count, unreviewed.rating_3_count), (0, 0))
+
+
+class OrderItemSnapshotBackfillTests(TestCase):
+    def test_items_from_before_the_snapshot_get_product_names(self):
+        product = Product.objects.create(
+            name='Kettle', description='Steel', price=10, stock=5, category=Category.objects.create(name='Kitchen'),
+            image='product_images/kettle.jpg',
+            image_variants={'source': 'product_images/kettle.jpg', 'thumbnail': {'webp': 'variants/kettle-thumb.webp'}},
+        )
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        order = Order.objects.create(user=user, total_price=10)
+        item = OrderItem.objects.create(order=order, product=product, quantity=1, price=10)
+        orphan = OrderItem.objects.create(order=order, product=None, quantity=1, price=5)
+
+        backfill = import_module('api.migrations.0032_backfill_order_item_snapshots')
+        backfill.populate_order_item_snapshots(apps, connection.schema_editor())
+
+        item.refresh_from_db()
+        orphan.refresh_from_db()
+        self.assertEqual((item.product_name, item.category_name, item.product_thumbnail),
+                         ('Kettle', 'Kitchen', 'variants/kettle-thumb.webp'))
+        self.assertEqual(orphan.product_name, '')
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Kitchen')
+        self.product = Product.objects.create(name='Kettle', description='Steel', price=10, stock=5, category=self.category)
+        self.client = APIClient()
+
+    def names(self):
+        return [product['name'] for product in self.client.get('/api/products/').data['results']]
+
+    def test_product_write_shows_up_once_committed(self):
+        self.assertEqual(self.names(), ['Kettle'])
+
+        self.product.name = 'Teapot'
+        self.product.save()
+        # Not committed yet: the version is bumped on commit, so the cached list still answers
+        self.assertEqual(self.names(), ['Kettle'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.names(), ['Teapot'])
+        self.assertEqual(self.client.get(f'/api/products/{self.product.pk}/').data['name'], 'Teapot')
+
+    def test_review_write_refreshes_the_product_detail(self):
+        detail = f'/api/products/{self.product.pk}/?expand=reviews'
+        self.assertEqual(self.client.get(detail).data['reviews'], [])
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=user, rating=5, comment='Great')
+
+        self.assertEqual([review['comment'] for review in self.client.get(detail).data['reviews']], ['Great'])
+
+    def test_category_write_refreshes_the_category_list(self):
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True)
+        self.client.force_authenticate(admin)
+        self.assertEqual([category['name'] for category in self.client.get('/api/admin/categories/').data], ['Kitchen'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Garden')
+
+        self.assertEqual(sorted(category['name'] for category in self.client.get('/api/admin/categories/').data),
+                         ['Garden', 'Kitchen'])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='secret')
+        category = Category.objects.create(name='Kitchen')
+        self.product = Product.objects.create(name='Kettle', description='Steel', price=10, stock=5, category=category)
+        self.client = APIClient()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_order_detail_revalidates_until_the_status_changes(self):
+        self.client.force_authenticate(self.user)
+        order = Order.objects.create(user=self.user, total_price=10)
+        url = f'/api/orders/{order.pk}/'
+        first = self.client.get(url)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        order.transition_status('shipped')
+        changed = self.revalidate(url, first)
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(changed.data['status'], 'shipped')
+
+    def test_product_detail_revalidates_until_the_product_changes(self):
+        url = f'/api/products/{self.product.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        self.product.price = 12
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        changed = self.revalidate(url, first)
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertEqual(changed.data['price'], 12)
+
+    def test_review_list_revalidates_until_a_review_is_added(self):
+        url = f'/api/products/{self.product.pk}/reviews/'
+        first = self.client.get(url)
+        self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        Review.objects.create(product=self.product, user=self.user, rating=4, comment='Fine')
+        changed = self.revalidate(url, first)
+
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual([review['comment'] for review in changed.data], ['Fine'])
+
+
+@override_settings(PRODUCT_PRICE_BUCKETS=[100])
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.kitchen = Category.objects.create(name='Kitchen')
+        garden = Category.objects.create(name='Garden')
+        for name, price, stock, category in [('Kettle', 50, 5, self.kitchen), ('Pan', 150, 0, self.kitchen),
+                                             ('Pot', 250, 3, self.kitchen), ('Hose', 80, 2, garden)]:
+            Product.objects.create(name=name, description=name, price=price, stock=stock, category=category)
+        self.client = APIClient()
+
+    def test_each_facet_ignores_its_own_filter(self):
+        response = self.client.get('/api/products/', {'category': self.kitchen.pk, 'in_stock': 'true', 'min_price': 100})
+
+        self.assertEqual([product['name'] for product in response.data['results']], ['Pot'])
+        facets = response.data['facets']
+        # Hose is in stock but under the price floor, so Garden would return nothing
+        self.assertEqual(facets['categories'], [{'id': self.kitchen.pk, 'name': 'Kitchen', 'count': 1}])
+        # Kettle and Pot are the in-stock kitchen products either side of 100; Pan is out of stock
+        self.assertEqual([(bucket['key'], bucket['count']) for bucket in facets['price']], [('0-100', 1), ('100+', 1)])
+
+    def test_facets_come_from_one_query(self):
+        filters = parse_product_filters({'in_stock': 'true'})
+
+        with self.assertNumQueries(1):
+            facets = product_facets(Product.objects.all(), filters)
+
+        self.assertEqual([(category['name'], category['count']) for category in facets['categories']],
+                         [('Garden', 1), ('Kitchen', 2)])
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True)
+        category = Category.objects.create(name='Kitchen')
+        kettle = Product.objects.create(name='Kettle', description='Steel', price=10, stock=5, category=category)
+        pan = Product.objects.create(name='Pan', description='Iron', price=4, stock=5, category=category)
+        self.paid = Order.objects.create(user=self.admin, total_price=18, is_paid=True)
+        OrderItem.objects.bulk_create([OrderItem.for_product(self.paid, kettle, 1),
+                                       OrderItem.for_product(self.paid, pan, 2)])
+        self.empty = Order.objects.create(user=self.admin, total_price=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, **params):
+        response = self.client.get('/api/admin/orders/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_has_a_row_per_line_and_one_for_an_order_without_lines(self):
+        response, body = self.export()
+
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([(row['order_id'], row['product_name'], row['quantity']) for row in rows], [
+            (str(self.paid.pk), 'Kettle', '1'),
+            (str(self.paid.pk), 'Pan', '2'),
+            (str(self.empty.pk), '', ''),
+        ])
+        self.assertEqual(rows[0]['customer_email'], 'admin@example.com')
+
+    def test_ndjson_follows_the_order_filters(self):
+        _, body = self.export(output='ndjson', is_paid='true')
+
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(row['order_id'], row['category_name'], row['unit_price']) for row in rows],
+                         [(self.paid.pk, 'Kitchen', '10.00'), (self.paid.pk, 'Kitchen', '4.00')])
+
+    def test_unknown_output_is_rejected(self):
+        response = self.client.get('/api/admin/orders/export/', {'output': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class StockSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        category = Category.objects.create(name='Kitchen')
+        self.kettle = Product.objects.create(name='Kettle', description='Steel', price=10, stock=5, category=category)
+        self.pan = Product.objects.create(name='Pan', description='Iron', price=4, stock=2, category=category)
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True))
+
+    def stock_listed(self):
+        return {product['name']: product['stock'] for product in APIClient().get('/api/products/').data['results']}
+
+    def test_sync_reports_unmatched_and_rejected_items_and_refreshes_the_catalog(self):
+        self.assertEqual(self.stock_listed(), {'Kettle': 5, 'Pan': 2})
+        before = self.kettle.updated_at
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/admin/products/stock-sync/', {'items': [
+                {'product_id': self.kettle.pk, 'stock': 40},
+                {'product_id': 999999, 'stock': 1},
+                {'product_id': self.pan.pk, 'delta': -3},
+            ]}, format='json')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {'updated': 1, 'unmatched': [999999], 'rejected': [self.pan.pk]})
+        self.kettle.refresh_from_db()
+        self.pan.refresh_from_db()
+        self.assertEqual((self.kettle.stock, self.pan.stock), (40, 2))
+        self.assertGreater(self.kettle.updated_at, before)
+        self.assertEqual(self.stock_listed(), {'Kettle': 40, 'Pan': 2})
+
+    def test_invalid_item_applies_nothing(self):
+        response = self.client.post('/api/admin/products/stock-sync/', {'items': [
+            {'product_id': self.kettle.pk, 'stock': 40},
+            {'product_id': self.pan.pk, 'stock': 1, 'delta': 1},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['errors']), {1})
+        self.kettle.refresh_from_db()
+        self.assertEqual(self.kettle.stock, 5)
@@ -29,19 +29,26 @@ urlpatterns = [
     path('admin/dashboard/', views.get_admin_dashboard),
     path('admin/products/', views.admin_get_products),
     path('admin/products/create/', views.admin_create_product),
+    path('admin/products/import/', views.admin_import_products),
+    path('admin/products/stock-sync/', views.admin_sync_stock),
     path('admin/products/<int:pk>/update/', views.admin_update_product),
     path('admin/products/<int:pk>/delete/', views.admin_delete_product),
     path('admin/users/', views.admin_get_users),
     path('admin/users/<int:pk>/', views.admin_update_user, name='admin-user-update'),
     path('admin/categories/', views.admin_get_categories),
+    path('admin/cache-stats/', views.admin_cache_stats),
+    path('admin/payment-stats/', views.admin_payment_stats),
+    path('admin/reports/sales/', views.admin_sales_report),
     path('admin/categories/create/', views.admin_create_category),
     path('admin/categories/<int:pk>/update/', views.admin_update_category),
     path('admin/categories/<int:pk>/delete/', views.admin_delete_category),
     path('admin/orders/', views.admin_get_orders, name='admin-get-orders'),
+    path('admin/orders/export/', views.admin_export_orders, name='admin-export-orders'),
     path('track-order/<str:tracking_code>/', views.track_order, name='track-order'),
     path("orders/<int:pk>/", order_detail, name="order_detail"),
     path('api/admin/orders/', filtered_orders, name='filtered-orders'),
     path('admin/orders/<int:order_id>/status/', admin_update_order_status, name='admin_update_order_status'),
+    path('admin/orders/bulk-status/', views.admin_bulk_update_order_status, name='admin-bulk-update-order-status'),
     path("user/orders/", views.list_user_orders, name="user-orders"),
     path("esewa/payment-confirm/", esewa_payment_confirm, name="esewa_payment_confirm"),
     
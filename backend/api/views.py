@@ -1,5 +1,3 @@
-import requests
-import random
 from rest_framework.response import Response
 from rest_framework import status, generics, permissions, viewsets
 from django.contrib.auth import get_user_model
@@ -8,28 +6,42 @@ from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly, IsAd
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404, redirect
 from django.conf import settings
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
 from django.db import transaction
-from django.db.models import Q
-from .serializers import UserSerializer, ProductSerializer, OrderSerializer, CartSerializer, ReviewSerializer, CategorySerializer,AdminOrderSerializer, UserRegistrationSerializer, AdminUserSerializer
-from .models import Product, Order, Cart, OrderItem, Review, Category
+from .serializers import ProductSerializer, OrderSerializer, CartSerializer, ReviewSerializer, CategorySerializer,AdminOrderSerializer, UserRegistrationSerializer, AdminUserSerializer
+from .serializers import with_product_fields, order_items_prefetch, order_serializer_class, wants_order_snapshot
+from .models import Product, Order, Cart, OrderItem, Review, Category, ProductRecommendation, OrderStatusConflict, DailySales
 from .permissions import IsVerifiedUser
+from .pagination import ProductCursorPagination, ProductSearchCursorPagination, OrderCursorPagination
+from .search import rank_products
+from .filters import filter_products, parse_product_filters, product_facets, filter_orders
+from .exports import export_orders, EXPORT_FORMATS
+from .imports import import_products, read_rows, guess_format, IMPORT_FORMATS
+from .inventory import reserve_stock, convert_reservations, sync_stock, InsufficientStock
+from .conditional import conditional_get
+from .idempotency import idempotent
+from .notifications import queue_order_update_email
+from .fulfilment import bulk_transition
+from .cache import cached_payload, cache_stats, request_cache_key, product_version, PRODUCT_LIST_VERSION, CATEGORY_LIST_VERSION
 from rest_framework.permissions import IsAdminUser
-from .utils import generate_esewa_payment_url, calculate_shipping_cost, verify_esewa_payment
-from django.core.mail import send_mail
+from .utils import generate_esewa_payment_url, calculate_shipping_cost
+from .payments import verify_esewa_payment, payment_gateway_stats, PaymentGatewayUnavailable
+from .reporting import record_order_sales, parse_report_range, sales_series
 from decimal import Decimal
 from django.db import transaction
 import hmac
 import hashlib
 import base64
 import logging
+import io
 import os
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import parser_classes
-from django.db.models import Sum, F, Count
-from django.utils.timezone import now, timedelta
+from django.db.models import Sum, F, Count, Max, prefetch_related_objects
 from django.db.models.functions import TruncDate
+from django.utils.timezone import now, timedelta, make_aware
+from datetime import datetime
 import xml.etree.ElementTree as ET
 from decouple import config
 from django.conf import settings
@@ -96,12 +108,56 @@ class ProductListCreateView(generics.ListCreateAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = ProductCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'GET':
+            queryset = filter_products(queryset, parse_product_filters(self.request.query_params))
+        return with_product_fields(queryset, self.request)
+
+    def _list_payload(self, request, *args, **kwargs):
+        data = super().list(request, *args, **kwargs).data
+        # Facets do not change while paging, so only the first page carries them
+        if not request.query_params.get(self.pagination_class.cursor_query_param):
+            data['facets'] = product_facets(Product.objects.all(), parse_product_filters(request.query_params))
+        return data
+
+    def list(self, request, *args, **kwargs):
+        data = cached_payload(
+            request_cache_key(request),
+            [PRODUCT_LIST_VERSION],
+            lambda: self._list_payload(request, *args, **kwargs),
+        )
+        return Response(data)
 
 class ProductDetailView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        return with_product_fields(super().get_queryset(), self.request)
+
+    def retrieve(self, request, *args, **kwargs):
+        # Reviews are embedded in the payload, so they are part of the validator
+        meta = (
+            Product.objects.filter(pk=kwargs['pk'])
+            .annotate(reviews_updated_at=Max('reviews__updated_at'), review_count=Count('reviews'))
+            .values('updated_at', 'reviews_updated_at', 'review_count')
+            .first()
+        )
+        if meta is None:
+            return super().retrieve(request, *args, **kwargs)  # 404
+
+        last_modified = max(filter(None, [meta['updated_at'], meta['reviews_updated_at']]))
+        validator = f"product:{kwargs['pk']}:{request.build_absolute_uri()}:{meta['updated_at']}:{meta['reviews_updated_at']}:{meta['review_count']}"
+        return conditional_get(request, validator, last_modified, lambda: Response(cached_payload(
+            request_cache_key(request),
+            [product_version(kwargs['pk'])],
+            lambda: super(ProductDetailView, self).retrieve(request, *args, **kwargs).data,
+        )))
+
 # Order Views
 class OrderListCreateView(generics.ListCreateAPIView):
     queryset = Order.objects.all()
@@ -113,6 +169,7 @@ class OrderListCreateView(generics.ListCreateAPIView):
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_order(request):
     user = request.user
     shipping_address = request.data.get("shipping_address")
@@ -128,11 +185,15 @@ def create_order(request):
             total_price = Decimal('0.00')
             products_to_update = []
 
-            # Lock product rows to prevent race conditions
+            # Lock product rows (in id order) to prevent race conditions
             product_ids = [item["product_id"] for item in items_data]
-            products = Product.objects.select_for_update().filter(id__in=product_ids)
+            products = (
+                Product.objects.select_related('category').select_for_update(of=('self',))
+                .filter(id__in=product_ids).order_by('id')
+            )
 
             product_map = {product.id: product for product in products}
+            quantities = {}
 
             for item in items_data:
                 product_id = item.get("product_id")
@@ -144,12 +205,8 @@ def create_order(request):
                 if not product:
                     return Response({"error": f"Product with id {product_id} not found."}, status=status.HTTP_404_NOT_FOUND)
 
-                if product.stock < quantity:
-                    return Response(
-                        {"error": f"Not enough stock for product '{product.name}'. Available: {product.stock}"},
-                        status=status.HTTP_400_BAD_REQUEST)
-
                 products_to_update.append((product, quantity))
+                quantities[product.id] = quantities.get(product.id, 0) + quantity
                 total_price += product.price * quantity
 
             # Temporarily create order to calculate shipping
@@ -176,15 +233,14 @@ def create_order(request):
                 city=city,
             )
 
-            # ✅ Only create OrderItems — don't reduce stock here!
-            for product, quantity in products_to_update:
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price=product.price,
-                )
+            # Stock is only held here; esewa_payment_confirm converts the reservation
+            reserve_stock(order, product_map, quantities)
+            OrderItem.objects.bulk_create([
+                OrderItem.for_product(order, product, quantity) for product, quantity in products_to_update
+            ])
 
+    except InsufficientStock as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except ValueError as e:
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -219,6 +275,14 @@ def update_order_total(request, order_id):
         "status": order.status,
     })
 
+def paginated_orders(request, orders):
+    """One keyset page of orders, with users and items (and their products) loaded in bulk."""
+    orders = orders.select_related('user').prefetch_related(order_items_prefetch(request))
+    paginator = OrderCursorPagination()
+    page = paginator.paginate_queryset(orders, request)
+    serializer = order_serializer_class(request)(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
+
 @api_view(["GET"])
 def get_orders(request):
     user = request.user
@@ -230,15 +294,7 @@ def get_orders(request):
         # Normal user sees only their own orders
         orders = Order.objects.filter(user=user)
 
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
-
-@api_view(["PATCH"])
-def update_order_status(request, order_id):
-    order = Order.objects.get(id=order_id)
-    order.status = request.data.get("status", order.status)
-    order.save()
-    return Response({"message": "Order updated successfully!"})
+    return paginated_orders(request, orders)
 
 # Cart Views
 class CartListCreateView(generics.ListCreateAPIView):
@@ -246,7 +302,9 @@ class CartListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return with_product_fields(
+            Cart.objects.filter(user=self.request.user).select_related('product'), self.request, 'product__'
+        )
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -275,7 +333,9 @@ class CartDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return with_product_fields(
+            Cart.objects.filter(user=self.request.user).select_related('product'), self.request, 'product__'
+        )
 
     def perform_update(self, serializer):
         product = serializer.validated_data.get("product", None)
@@ -292,23 +352,40 @@ class CartDetailView(generics.RetrieveUpdateDestroyAPIView):
 class CheckoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @idempotent
     def post(self, request):
         user = request.user
-        cart_items = Cart.objects.filter(user=user)
-
-        if not cart_items:
-            return Response({"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
-
-        total_price = sum(item.product.price * item.quantity for item in cart_items)
-
-        with transaction.atomic():
-            order = Order.objects.create(user=user, total_price=total_price)
-            for item in cart_items:
-                OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, price=item.product.price)
-                item.product.stock -= item.quantity
-                item.product.save()
 
-        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+        try:
+            with transaction.atomic():
+                # One query loads the cart with its products and locks both, in product id order
+                cart_items = list(
+                    Cart.objects.filter(user=user)
+                    .select_related('product__category')
+                    .select_for_update(of=('self', 'product'))
+                    .order_by('product_id', 'id')
+                )
+                if not cart_items:
+                    return Response({"error": "Cart is empty"}, status=status.HTTP_400_BAD_REQUEST)
+
+                quantities = {}
+                for item in cart_items:
+                    quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+                products = {item.product_id: item.product for item in cart_items}
+
+                total_price = sum(item.product.price * item.quantity for item in cart_items)
+                order = Order.objects.create(user=user, total_price=total_price)
+                OrderItem.objects.bulk_create([
+                    OrderItem.for_product(order, item.product, item.quantity) for item in cart_items
+                ])
+                # Stock is only held here, like create_order; esewa_payment_confirm takes it
+                reserve_stock(order, products, quantities)
+                Cart.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+        except InsufficientStock as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        prefetch_related_objects([order], order_items_prefetch(request))
+        return Response(OrderSerializer(order, context={'request': request}).data, status=status.HTTP_201_CREATED)
 
 # Generate HMAC SHA-256 signature for eSewa payment form
 def generate_esewa_signature(payload, secret_key):
@@ -322,28 +399,6 @@ def generate_esewa_signature(payload, secret_key):
     logger.debug(f"Generated signature: {signature}")
     return signature
 
-# Verify payment status via eSewa API
-def verify_esewa_payment(transaction_uuid, amount):
-    verification_url = "https://rc.esewa.com.np/api/epay/transaction/status/"
-    params = {
-        'product_code': MERCHANT_CODE,
-        'transaction_uuid': transaction_uuid,
-        'total_amount': str(amount)
-    }
-
-    try:
-        response = requests.get(verification_url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        logger.info(f"🚀 eSewa verification response JSON: {data}")
-        return data.get("status") == "COMPLETE"
-    except requests.RequestException as e:
-        logger.error(f"❌ Error during verification: {e}")
-        return False
-    except ValueError as e:
-        logger.error(f"❌ JSON decode error during verification: {e}")
-        return False
-
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
 def esewa_payment(request):
@@ -410,7 +465,12 @@ def esewa_success(request):
 
     logger.info(f"🔍 Verifying eSewa payment for UUID={transaction_uuid}, Amount={amount}...")
 
-    if verify_esewa_payment(transaction_uuid, amount):
+    try:
+        verified = verify_esewa_payment(transaction_uuid, amount)
+    except PaymentGatewayUnavailable:
+        return redirect(f"{FRONTEND_FAILURE_URL}?error=Payment%20gateway%20unavailable")
+
+    if verified:
         try:
             parts = transaction_uuid.split("_")
             if len(parts) < 2 or not parts[1].isdigit():
@@ -442,6 +502,7 @@ def esewa_failure(request):
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def esewa_payment_confirm(request):
     order_id = request.data.get("order_id")
     transaction_uuid = request.data.get("transaction_uuid")
@@ -450,34 +511,47 @@ def esewa_payment_confirm(request):
         return Response({"error": "order_id and transaction_uuid are required"}, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        with transaction.atomic():
-            order = Order.objects.select_for_update().get(id=order_id, user=request.user)
+        order = Order.objects.get(id=order_id, user=request.user)
+    except Order.DoesNotExist:
+        return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            if order.is_paid:
-                return Response({"message": "Order is already paid"}, status=status.HTTP_200_OK)
+    if order.is_paid:
+        return Response({"message": "Order is already paid"}, status=status.HTTP_200_OK)
 
-            amount = order.total_price
+    # Ask the gateway before taking any locks; a slow eSewa must not hold the order row
+    amount = order.total_price
+    try:
+        verified = verify_esewa_payment(transaction_uuid, amount)
+    except PaymentGatewayUnavailable as e:
+        return Response({"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={"Retry-After": str(settings.ESEWA_BREAKER_COOLDOWN)})
+    if not verified:
+        return Response({"error": "Payment verification failed"}, status=status.HTTP_400_BAD_REQUEST)
 
-            if not verify_esewa_payment(transaction_uuid, amount):
-                return Response({"error": "Payment verification failed"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        with transaction.atomic():
+            # Re-check under the lock: another request may have confirmed or repriced the order meanwhile
+            order = Order.objects.select_for_update().get(id=order.id)
 
-            for item in order.items.all():
-                product = item.product
-                if product.stock < item.quantity:
-                    return Response({"error": f"Insufficient stock for product {product.id}"}, status=status.HTTP_400_BAD_REQUEST)
+            if order.is_paid:
+                return Response({"message": "Order is already paid"}, status=status.HTTP_200_OK)
+            if order.total_price != amount:
+                return Response({"error": "Order total changed during payment verification"},
+                                status=status.HTTP_409_CONFLICT)
 
-            for item in order.items.all():
-                product = item.product
-                product.stock -= item.quantity
-                product.save(update_fields=["stock"])
+            # The stock was reserved by create_order; this only converts the hold
+            convert_reservations(order)
+            record_order_sales(order)
 
-            order.is_paid = True
             if order.status == "pending":
-                order.status = "shipped"
-            order.save(update_fields=["is_paid", "status"])
+                order.transition_status("shipped", changed_by=request.user, is_paid=True, paid_at=now())
+            else:
+                order.is_paid = True
+                order.paid_at = now()
+                order.save(update_fields=["is_paid", "paid_at", "updated_at"])
 
-    except Order.DoesNotExist:
-        return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
+    except InsufficientStock as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({"message": "Payment confirmed and order updated", "order_id": order.id})
 
@@ -487,13 +561,13 @@ def search_products(request):
     try:
         query = request.GET.get("q", "").strip()
         if not query:
-            return Response([], status=status.HTTP_200_OK)
+            return Response({"next": None, "previous": None, "results": []}, status=status.HTTP_200_OK)
 
-        products = Product.objects.filter(
-            Q(name__icontains=query) | Q(description__icontains=query)
-        )
-        serialized = ProductSerializer(products, many=True, context={'request': request})  # pass request here
-        return Response(serialized.data, status=status.HTTP_200_OK)
+        products = rank_products(with_product_fields(Product.objects.all(), request), query)
+        paginator = ProductSearchCursorPagination()
+        page = paginator.paginate_queryset(products, request)
+        serialized = ProductSerializer(page, many=True, context={'request': request})  # pass request here
+        return paginator.get_paginated_response(serialized.data)
 
     except Exception as e:
         logger.error(f"Search error: {e}", exc_info=True)
@@ -508,49 +582,61 @@ def product_detail(request, product_id):
     serializer = ProductSerializer(product, context={'request': request})
     return Response(serializer.data)
 
+RECOMMENDATION_LIMIT = 8
+
 @api_view(["GET"])
 def recommend_products(request, product_id):
     try:
-        product = Product.objects.get(id=product_id)
+        product = Product.objects.only("id", "category_id").get(id=product_id)
     except Product.DoesNotExist:
         return Response({"error": "Product not found"}, status=404)
 
-    # Content-based: same category excluding current product
-    content_based = list(Product.objects.filter(category=product.category).exclude(id=product.id))
-
-    # Collaborative (dummy): random products excluding current and content-based
-    excluded_ids = [p.id for p in content_based] + [product.id]
-    all_products = Product.objects.exclude(id__in=excluded_ids)
-    random_based = random.sample(list(all_products), min(3, all_products.count()))
-
-    # Combine recommendations, limit total if desired
-    combined_recommendations = content_based[:5] + random_based
+    # Frequently bought together, precomputed by the build_recommendations command
+    recommendations = [
+        rec.recommended
+        for rec in with_product_fields(
+            ProductRecommendation.objects.filter(product_id=product.id).select_related("recommended"),
+            request, "recommended__",
+        )
+        .order_by("-score")[:RECOMMENDATION_LIMIT]
+    ]
+
+    # Fill the remaining slots from the same category (bounded query)
+    missing = RECOMMENDATION_LIMIT - len(recommendations)
+    if missing > 0:
+        excluded_ids = [p.id for p in recommendations] + [product.id]
+        recommendations += list(
+            with_product_fields(Product.objects.filter(category_id=product.category_id), request)
+            .exclude(id__in=excluded_ids)
+            .order_by("-rating_avg", "-id")[:missing]
+        )
 
-    serializer = ProductSerializer(combined_recommendations, many=True, context={'request': request})
+    serializer = ProductSerializer(recommendations, many=True, context={'request': request})
     return Response(serializer.data)
 
-def send_order_update_email(order):
-    subject = f"Order Update: {order.tracking_code}"
-    message = f"Your order {order.tracking_code} is now {order.status}."
-    recipient = order.user.email
-
-    send_mail(
-        subject,
-        message,
-        settings.EMAIL_HOST_USER,
-        [recipient],
-        fail_silently=False,
-    )
+def status_conflict_response(order, error):
+    current = Order.objects.filter(pk=order.pk).values_list("status", flat=True).first()
+    return Response({"error": str(error), "status": current}, status=status.HTTP_409_CONFLICT)
 
 @api_view(["PATCH"])
 def update_order_status(request, order_id):
-    order = Order.objects.get(id=order_id)
+    order = get_object_or_404(Order.objects.select_related("user"), id=order_id)
     new_status = request.data.get("status", order.status)
 
     if order.status != new_status:
-        order.status = new_status
-        order.save()
-        send_order_update_email(order)
+        try:
+            # The customer email is queued in the same transaction as the change
+            with transaction.atomic():
+                order.transition_status(
+                    new_status,
+                    changed_by=request.user if request.user.is_authenticated else None,
+                    expected_status=request.data.get("expected_status"),
+                )
+                queue_order_update_email(order)
+        except ValidationError as e:
+            return Response({"error": e.messages}, status=status.HTTP_400_BAD_REQUEST)
+        except OrderStatusConflict as e:
+            return status_conflict_response(order, e)
 
     return Response({"message": f"Order {order.tracking_code} updated to {new_status}."})
 
@@ -559,18 +645,38 @@ def update_order_status(request, order_id):
 @permission_classes([IsAuthenticatedOrReadOnly])
 def track_order(request, tracking_code):
     try:
-        order = Order.objects.get(tracking_code=tracking_code)
+        order = orders_for_rendering(request).get(tracking_code=tracking_code)
     except Order.DoesNotExist:
         return Response({"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    print("Request user:", request.user)
-    print("Order user:", order.user)
-
-    if request.user.is_authenticated and order.user != request.user:
+    if request.user.is_authenticated and order.user_id != request.user.id:
         return Response({"error": "Not authorized to view this order"}, status=status.HTTP_403_FORBIDDEN)
 
-    serializer = OrderSerializer(order, context={'request': request})
-    return Response(serializer.data)
+    validator, last_modified = order_validator(order)
+    return conditional_get(
+        request, f"{validator}:{request.build_absolute_uri()}", last_modified,
+        lambda: Response(render_order(order, request)),
+        private=True,
+    )
+
+def render_order(order, request):
+    # Items are only loaded once we know the client needs the body
+    prefetch_related_objects([order], order_items_prefetch(request))
+    return order_serializer_class(request)(order, context={'request': request}).data
+
+def orders_for_rendering(request):
+    """Orders annotated with what order_validator needs for the requested shape."""
+    orders = Order.objects.select_related('user')
+    if wants_order_snapshot(request):
+        return orders  # the snapshot body never reads the catalog
+    # Embedded products are part of the body, so their changes are part of the validator
+    return orders.annotate(products_updated_at=Max('items__product__updated_at'))
+
+def order_validator(order):
+    """ETag source and Last-Modified for an order from orders_for_rendering."""
+    products_updated_at = getattr(order, 'products_updated_at', None)
+    last_modified = max(filter(None, [order.updated_at, products_updated_at]))
+    return f"order:{order.pk}:{order.updated_at}:{products_updated_at}", last_modified
 
     
 
@@ -579,8 +685,12 @@ class ProductReviewView(APIView):
 
     def get(self, request, product_id):
         reviews = Review.objects.filter(product_id=product_id).select_related('user')
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+        meta = reviews.aggregate(updated_at=Max('updated_at'), count=Count('id'))
+        validator = f"reviews:{product_id}:{meta['updated_at']}:{meta['count']}"
+        return conditional_get(
+            request, validator, meta['updated_at'],
+            lambda: Response(ReviewSerializer(reviews, many=True).data),
+        )
 
     def post(self, request, product_id):
         product = get_object_or_404(Product, id=product_id)
@@ -597,7 +707,9 @@ class ProductReviewView(APIView):
             context={'request': request, 'product': product}
         )
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                review = serializer.save()
+                product.update_rating_summary(added=review.rating)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -612,36 +724,43 @@ class MyProductReviewView(APIView):
         return Response(serializer.data)
 
     def put(self, request, product_id):
-        review = get_object_or_404(Review, product_id=product_id, user=request.user)
-        serializer = ReviewSerializer(
-            review,
-            data=request.data,
-            context={'request': request, 'product': review.product},
-            partial=False
-        )
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return self._update(request, product_id, partial=False)
 
     def patch(self, request, product_id):
-        review = get_object_or_404(Review, product_id=product_id, user=request.user)
-        serializer = ReviewSerializer(
-            review,
-            data=request.data,
-            context={'request': request, 'product': review.product},
-            partial=True
-        )
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return self._update(request, product_id, partial=True)
 
     def delete(self, request, product_id):
-        review = get_object_or_404(Review, product_id=product_id, user=request.user)
-        review.delete()
+        with transaction.atomic():
+            review = get_object_or_404(
+                Review.objects.select_for_update(of=('self',)).select_related('product'),
+                product_id=product_id, user=request.user,
+            )
+            review.delete()
+            review.product.update_rating_summary(removed=review.rating)
         return Response({"detail": "Review deleted."}, status=status.HTTP_204_NO_CONTENT)
 
+    def _update(self, request, product_id, partial):
+        with transaction.atomic():
+            # Lock the review so the old rating we subtract is the one we replace
+            review = get_object_or_404(
+                Review.objects.select_for_update(of=('self',)).select_related('product'),
+                product_id=product_id, user=request.user,
+            )
+            old_rating = review.rating
+            serializer = ReviewSerializer(
+                review,
+                data=request.data,
+                context={'request': request, 'product': review.product},
+                partial=partial
+            )
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            review = serializer.save()
+            if review.rating != old_rating:
+                review.product.update_rating_summary(added=review.rating, removed=old_rating)
+        return Response(serializer.data)
+
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
 def get_admin_dashboard(request):
@@ -656,15 +775,20 @@ def get_admin_dashboard(request):
         start_date = None  # all time
 
     orders = Order.objects.all()
+    sales = DailySales.objects.all()
     if start_date:
-        orders = orders.filter(created_at__date__gte=start_date)
+        # A range on created_at itself rather than its date, so it can use an index
+        orders = orders.filter(created_at__gte=make_aware(datetime.combine(start_date, datetime.min.time())))
+        sales = sales.filter(date__gte=start_date)
 
-    # Filter only paid orders regardless of status
-    paid_orders = orders.filter(is_paid=True)
+    # Product and category charts read the daily rollup of paid sales (kept by
+    # esewa_payment_confirm, rebuilt by the rebuild_daily_sales command), never the order items
 
-    # 1. Sales Over Time
+    # 1. Sales Over Time: paid order totals, shipping included, which the rollup
+    # does not hold; one pass over the (is_paid, created_at) index
     sales_over_time = (
-        paid_orders.annotate(date=TruncDate("created_at"))
+        orders.filter(is_paid=True)
+        .annotate(date=TruncDate("created_at"))
         .values("date")
         .annotate(total_sales=Sum("total_price"))
         .order_by("date")
@@ -672,34 +796,23 @@ def get_admin_dashboard(request):
 
     # 2. Top 5 Best Selling Products
     top_products = (
-        OrderItem.objects.filter(order__in=paid_orders)
-        .values(name=F("product__name"))
-        .annotate(sales=Sum(F("price") * F("quantity")))
+        sales.values(name=F("product_name"))
+        .annotate(sales=Sum("revenue"))
         .order_by("-sales")[:5]
     )
 
     # 3. Sales by Category
     sales_by_category = (
-        OrderItem.objects.filter(order__in=paid_orders)
-        .values(category=F("product__category__name"))
-        .annotate(sales=Sum(F("price") * F("quantity")))
+        sales.values(category=F("category_name"))
+        .annotate(sales=Sum("revenue"))
         .order_by("-sales")
     )
 
-    products = Product.objects.all()
-    categories = Category.objects.all()
-    users = User.objects.all()
-
     return Response({
-        "total_products": products.count(),
+        "total_products": Product.objects.count(),
         "total_orders": orders.count(),
-        "total_categories": categories.count(),
-        "total_users": users.count(),
-
-        "products": ProductSerializer(products, many=True).data,
-        "orders": OrderSerializer(orders, many=True).data,
-        "categories": CategorySerializer(categories, many=True).data,
-        "users": UserSerializer(users, many=True).data,
+        "total_categories": Category.objects.count(),
+        "total_users": User.objects.count(),
 
         "sales_over_time": sales_over_time,
         "top_products": top_products,
@@ -711,9 +824,11 @@ def get_admin_dashboard(request):
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_get_products(request):
-    products = Product.objects.all()
-    serializer = ProductSerializer(products, many=True, context={'request': request})
-    return Response(serializer.data)
+    products = with_product_fields(Product.objects.all(), request)
+    paginator = ProductCursorPagination()
+    page = paginator.paginate_queryset(products, request)
+    serializer = ProductSerializer(page, many=True, context={'request': request})
+    return paginator.get_paginated_response(serializer.data)
 
 # Create product
 @api_view(['POST'])
@@ -726,6 +841,73 @@ def admin_create_product(request):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Create or update many products from an uploaded CSV or JSON Lines file
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def admin_import_products(request):
+    """
+    Upserts products by sku from the uploaded `file` (see api.imports for the
+    columns). The format comes from ?input=csv|ndjson or the file extension.
+    Bad rows are listed in the response; the rest are still imported.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'detail': 'Upload the catalog as `file`.'}, status=status.HTTP_400_BAD_REQUEST)
+    input_format = request.query_params.get('input') or guess_format(upload.name)
+    if input_format not in IMPORT_FORMATS:
+        return Response({'detail': f'Unknown input format. Valid options: {", ".join(IMPORT_FORMATS)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    # Parsed as it is read, row by row, from the upload's file
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    report = import_products(read_rows(stream, input_format))
+    return Response(report)
+
+STOCK_SYNC_MAX_ITEMS = 50000
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# Push stock counts from an inventory system
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def admin_sync_stock(request):
+    """
+    Sets or adjusts stock for many products at once.
+    Body: {"items": [{"product_id": 1, "stock": 40}, {"product_id": 2, "delta": -3}, ...]}
+    "stock" replaces the count, "delta" is added to it (never below zero).
+    Responds with how many products changed, ids with no product, and rejected deltas.
+    """
+    items = request.data.get('items')
+    if not isinstance(items, list) or not items:
+        return Response({'detail': 'items must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > STOCK_SYNC_MAX_ITEMS:
+        return Response({'detail': f'At most {STOCK_SYNC_MAX_ITEMS} items per request.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    levels, deltas, errors = {}, {}, {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not _is_int(item.get('product_id')):
+            errors[index] = 'product_id must be an integer.'
+        elif ('stock' in item) == ('delta' in item):
+            errors[index] = 'Give exactly one of stock or delta.'
+        elif 'stock' in item:
+            if not _is_int(item['stock']) or item['stock'] < 0:
+                errors[index] = 'stock must be a non-negative integer.'
+            else:
+                levels[item['product_id']] = item['stock']
+        elif not _is_int(item['delta']):
+            errors[index] = 'delta must be an integer.'
+        else:
+            deltas[item['product_id']] = deltas.get(item['product_id'], 0) + item['delta']
+    if errors:
+        return Response({'detail': 'Invalid items; nothing was applied.', 'errors': errors},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    result = sync_stock(levels, deltas)
+    return Response({**result, 'updated': len(result['updated'])})
+
 # Update product
 @api_view(['PUT'])
 @permission_classes([IsAdminUser])
@@ -769,9 +951,32 @@ def admin_update_user(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_get_categories(request):
-    categories = Category.objects.all()
-    serializer = CategorySerializer(categories, many=True)
-    return Response(serializer.data)
+    data = cached_payload(
+        request_cache_key(request),
+        [CATEGORY_LIST_VERSION],
+        lambda: CategorySerializer(Category.objects.all(), many=True).data,
+    )
+    return Response(data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_cache_stats(request):
+    return Response(cache_stats())
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_sales_report(request):
+    """
+    Paid sales over ?date_from=&date_to= in ?bucket=hour|day|week|month
+    buckets, with empty buckets filled in (see api.reporting).
+    """
+    date_from, date_to, bucket = parse_report_range(request.query_params)
+    return Response(sales_series(date_from, date_to, bucket))
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_payment_stats(request):
+    return Response(payment_gateway_stats())
 
 @api_view(['POST'])
 @permission_classes([IsAdminUser])
@@ -802,26 +1007,26 @@ def admin_delete_category(request, pk):
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def admin_get_orders(request):
-    orders = Order.objects.all().order_by('-created_at')  # newest first
+    # ?is_paid=, ?status=pending,shipped, ?date_from=/?date_to= (see api.filters); newest first
+    orders = filter_orders(Order.objects.all(), request.query_params)
+    return paginated_orders(request, orders)
 
-    # Get query params
-    is_paid = request.query_params.get('is_paid')  # 'true' or 'false'
-    status = request.query_params.get('status')    # e.g. "pending,shipped"
-
-    # Filter by payment status using the boolean field
-    if is_paid is not None:
-        if is_paid.lower() == 'true':
-            orders = orders.filter(is_paid=True)
-        elif is_paid.lower() == 'false':
-            orders = orders.filter(is_paid=False)
-
-    # Filter by delivery status
-    if status:
-        statuses = [s.strip() for s in status.split(',')]
-        orders = orders.filter(status__in=statuses)
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_export_orders(request):
+    """
+    Streams every order line matching the admin_get_orders filters as CSV
+    (default) or NDJSON with ?output=ndjson.
+    """
+    output = request.query_params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        return Response({'detail': f'Invalid output. Valid options: {", ".join(EXPORT_FORMATS)}'},
+                        status=status.HTTP_400_BAD_REQUEST)
 
-    serializer = OrderSerializer(orders, many=True, context={'request': request})
-    return Response(serializer.data)
+    orders = filter_orders(Order.objects.all(), request.query_params)
+    response = StreamingHttpResponse(export_orders(orders, output), content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="orders-{now():%Y%m%d-%H%M%S}.{output}"'
+    return response
 
 
 
@@ -829,9 +1034,10 @@ def admin_get_orders(request):
 class AdminOrderListView(generics.ListAPIView):
     serializer_class = AdminOrderSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
-        return Order.objects.prefetch_related('order_items__product').all()
+        return Order.objects.select_related('user').prefetch_related(order_items_prefetch(self.request))
     
 
 @api_view(['GET'])
@@ -845,11 +1051,16 @@ def list_users(request):
 @permission_classes([IsAuthenticated])
 def order_detail(request, pk):
     try:
-        order = Order.objects.get(pk=pk, user=request.user)
-        serializer = OrderSerializer(order)
-        return Response(serializer.data)
+        order = orders_for_rendering(request).get(pk=pk, user=request.user)
     except Order.DoesNotExist:
         return Response({"error": "Order not found"}, status=404)
+
+    validator, last_modified = order_validator(order)
+    return conditional_get(
+        request, f"{validator}:{request.build_absolute_uri()}", last_modified,
+        lambda: Response(render_order(order, request)),
+        private=True,
+    )
     
 @api_view(['GET'])
 @permission_classes([IsAdminUser])  # Only admins can access
@@ -868,8 +1079,7 @@ def filtered_orders(request):
         if statuses:
             orders = orders.filter(status__in=statuses)
 
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    return paginated_orders(request, orders)
 
 @api_view(['PATCH'])
 @permission_classes([IsAdminUser])
@@ -890,21 +1100,51 @@ def admin_update_order_status(request, order_id):
         return Response({'detail': f'Invalid status. Valid options: {", ".join(valid_statuses)}'},
                         status=status.HTTP_400_BAD_REQUEST)
 
-    order.status = new_status
-
+    # Clients may send the status they saw as expected_status; the update only applies if it still holds
+    expected_status = request.data.get('expected_status')
+    if new_status == order.status and expected_status in (None, new_status):
+        # Re-sending the current status is a no-op, as it was before compare-and-set updates
+        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
     try:
-        order.full_clean()  # You can remove this if no custom validation is added
-        order.save(update_fields=['status'])
+        order.transition_status(new_status, changed_by=request.user, expected_status=expected_status)
     except ValidationError as e:
         return Response({'detail': e.messages}, status=status.HTTP_400_BAD_REQUEST)
+    except OrderStatusConflict as e:
+        return status_conflict_response(order, e)
 
     serializer = OrderSerializer(order)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
+BULK_STATUS_MAX_ORDERS = 5000
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def admin_bulk_update_order_status(request):
+    """
+    Moves many orders to one status, e.g. a fulfilment batch to out_for_delivery.
+    Body: {"status": ..., "orders": [order ids and/or tracking codes]}.
+    Responds with a result per order; customer emails are queued, not sent inline.
+    """
+    new_status = request.data.get('status')
+    refs = request.data.get('orders')
+    if new_status not in dict(Order.STATUS_CHOICES):
+        return Response({'detail': f'Invalid status. Valid options: {", ".join(dict(Order.STATUS_CHOICES))}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not isinstance(refs, list) or not refs:
+        return Response({'detail': 'orders must be a non-empty list of order ids or tracking codes.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(refs) > BULK_STATUS_MAX_ORDERS:
+        return Response({'detail': f'At most {BULK_STATUS_MAX_ORDERS} orders per request.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    results = bulk_transition(refs, new_status, changed_by=request.user)
+    return Response({
+        'updated': sum(1 for result in results if result['result'] == 'updated'),
+        'results': results,
+    })
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def list_user_orders(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    return paginated_orders(request, Order.objects.filter(user=request.user))
 
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'rest_framework_simplejwt',
@@ -117,6 +118,17 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = r'D:\SQLPARUHANG\Ecommerce\Ecommerce\backend\media'
 
+# Product image derivatives (see api.images); generated on a worker thread after upload
+IMAGE_VARIANTS_ASYNC = env.bool("IMAGE_VARIANTS_ASYNC", default=True)
+IMAGE_VARIANT_WORKERS = env.int("IMAGE_VARIANT_WORKERS", default=2)
+
+# Media serving (see api.media). Content-hashed variant names are cached as immutable,
+# everything else for MEDIA_CACHE_MAX_AGE seconds. Behind nginx, set
+# MEDIA_ACCEL_REDIRECT_PREFIX to an `internal` location aliased to MEDIA_ROOT so
+# nginx streams the bytes instead of a Django worker.
+MEDIA_CACHE_MAX_AGE = env.int("MEDIA_CACHE_MAX_AGE", default=3600)
+MEDIA_ACCEL_REDIRECT_PREFIX = env("MEDIA_ACCEL_REDIRECT_PREFIX", default='')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'api.User'
@@ -137,6 +149,43 @@ REST_FRAMEWORK = {
     },
 }
 
+# Cache for public catalog reads (see api.cache). Any backend works, e.g.
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache with a directory as CACHE_LOCATION.
+# LocMemCache is per process: with several workers use a shared backend such as
+# django.core.cache.backends.redis.RedisCache so they share catalog versions and the
+# eSewa circuit breaker and gateway stats (see api.payments).
+CACHES = {
+    'default': {
+        'BACKEND': env("CACHE_BACKEND", default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env("CACHE_LOCATION", default='ecommerce-catalog'),
+    }
+}
+CATALOG_CACHE_TIMEOUT = env.int("CATALOG_CACHE_TIMEOUT", default=300)
+CATALOG_CACHE_LOCK_TIMEOUT = env.int("CATALOG_CACHE_LOCK_TIMEOUT", default=5)
+
+# Product catalog pagination (?page_size= is capped at the max)
+PRODUCT_PAGE_SIZE = env.int("PRODUCT_PAGE_SIZE", default=24)
+PRODUCT_MAX_PAGE_SIZE = env.int("PRODUCT_MAX_PAGE_SIZE", default=100)
+# Order history pagination (?page_size= is capped at the max)
+ORDER_PAGE_SIZE = env.int("ORDER_PAGE_SIZE", default=20)
+ORDER_MAX_PAGE_SIZE = env.int("ORDER_MAX_PAGE_SIZE", default=100)
+
+# How long create_order holds stock for an unpaid order (see api.inventory)
+STOCK_RESERVATION_MINUTES = env.int("STOCK_RESERVATION_MINUTES", default=15)
+
+# Idempotency-Key handling on order/checkout/payment POSTs (see api.idempotency).
+# Keys are replayable for the TTL; an in-flight claim older than the lock timeout is
+# treated as abandoned.
+IDEMPOTENCY_KEY_TTL_HOURS = env.int("IDEMPOTENCY_KEY_TTL_HOURS", default=24)
+IDEMPOTENCY_LOCK_TIMEOUT = env.int("IDEMPOTENCY_LOCK_TIMEOUT", default=60)
+
+# build_recommendations only reads orders paid at least this many seconds ago, so a
+# payment whose transaction commits after a run has started is not skipped by the watermark
+RECOMMENDATION_INDEX_LAG = env.int("RECOMMENDATION_INDEX_LAG", default=300)
+
+# Upper bounds of the price facet buckets on the product list; the last bucket is open-ended
+PRODUCT_PRICE_BUCKETS = env.list("PRODUCT_PRICE_BUCKETS", cast=int, default=[500, 1000, 2500, 5000, 10000])
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -155,6 +204,9 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Origins allowed to load /media/ cross-origin (see DevMediaCORSHeadersMiddleware)
+MEDIA_CORS_ALLOWED_ORIGINS = env.list("MEDIA_CORS_ALLOWED_ORIGINS", default=CORS_ALLOWED_ORIGINS)
+
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
@@ -165,17 +217,34 @@ CSRF_TRUSTED_ORIGINS = [
 
 # eSewa credentials
 ESEWA_MERCHANT_ID = env("ESEWA_MERCHANT_ID")
+ESEWA_MERCHANT_CODE = env("ESEWA_MERCHANT_CODE")
 FRONTEND_SUCCESS_URL = env("ESEWA_RETURN_URL")
 FRONTEND_FAILURE_URL = env("ESEWA_FAILURE_URL")
 
+# eSewa payment verification (see api.payments). Requests share a keep-alive pool per
+# process; after ESEWA_BREAKER_THRESHOLD consecutive gateway failures verification is
+# refused for ESEWA_BREAKER_COOLDOWN seconds instead of tying up workers on timeouts, then
+# a single request probes the gateway. The breaker is kept in CACHES['default'].
+ESEWA_VERIFY_URL = env("ESEWA_VERIFY_URL", default="https://rc.esewa.com.np/api/epay/transaction/status/")
+ESEWA_VERIFY_CONNECT_TIMEOUT = env.float("ESEWA_VERIFY_CONNECT_TIMEOUT", default=3.05)
+ESEWA_VERIFY_READ_TIMEOUT = env.float("ESEWA_VERIFY_READ_TIMEOUT", default=10)
+ESEWA_HTTP_POOL_SIZE = env.int("ESEWA_HTTP_POOL_SIZE", default=10)
+ESEWA_BREAKER_THRESHOLD = env.int("ESEWA_BREAKER_THRESHOLD", default=5)
+ESEWA_BREAKER_COOLDOWN = env.int("ESEWA_BREAKER_COOLDOWN", default=30)
+
 # Email
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_BACKEND = env("EMAIL_BACKEND", default="django.core.mail.backends.smtp.EmailBackend")
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = env("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = env("EMAIL_HOST_PASSWORD")
 
+# Email outbox worker (see the send_queued_emails command). A failed message is retried
+# after EMAIL_OUTBOX_RETRY_SECONDS * 2**(attempts - 1) and dead-lettered after the max attempts.
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int("EMAIL_OUTBOX_MAX_ATTEMPTS", default=5)
+EMAIL_OUTBOX_RETRY_SECONDS = env.int("EMAIL_OUTBOX_RETRY_SECONDS", default=60)
+
 # Logging
 LOGGING = {
     "version": 1,
@@ -17,8 +17,8 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.views.static import serve
 from django.urls import re_path
+from api.media import serve_media
 from api.views import esewa_success, esewa_failure, esewa_payment_confirm
 
 urlpatterns = [
@@ -29,6 +29,7 @@ urlpatterns = [
 ]
 
 urlpatterns += [
-    # Serve media files through the view so middleware applies
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    # Serve media files through the view so middleware applies (range requests,
+    # caching headers and optional X-Accel-Redirect offload live in api.media)
+    re_path(r'^media/(?P<path>.*)$', serve_media),
 ]
\ No newline at end of file
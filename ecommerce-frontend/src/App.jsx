@@ -31,7 +31,7 @@ function App() {
   useEffect(() => {
     setLoading(true);
     fetchProducts()
-      .then(setResults)
+      .then(({ results }) => setResults(results))
       .finally(() => setLoading(false));
   }, []);
 
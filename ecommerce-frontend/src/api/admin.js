@@ -7,8 +7,9 @@ export const getAdminDashboard = (filter = "") => {
 };
 
 // Products
-export const getAdminProducts = () => {
-  return api.get(endpoints.adminProducts);
+// pageUrl is the "next" link of a previous page; omit it for the first page
+export const getAdminProducts = (pageUrl = null) => {
+  return api.get(pageUrl || endpoints.adminProducts);
 };
 
 // For create and update, productData can be FormData or JSON object
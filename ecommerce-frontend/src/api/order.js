@@ -17,6 +17,7 @@ export const trackOrder = async (trackingCode) => {
   return api.get(endpoints.orderTrack(trackingCode));
 };
 
-export const getUserOrders = async () => {
-  return api.get(endpoints.userOrders);
+// pageUrl is the "next" link of a previous page; omit it for the first page
+export const getUserOrders = async (pageUrl = null) => {
+  return api.get(pageUrl || endpoints.userOrders);
 };
\ No newline at end of file
@@ -1,10 +1,16 @@
 import api from "./axios";
 import endpoints from "../config";
 
-export const fetchProducts = async () => {
+// Both listings are cursor-paginated: they resolve to { results, next }, and passing
+// next back as pageUrl fetches the following page (it already carries the filters).
+
+// params: optional filters, e.g. { category: "1,2", min_price: 500, in_stock: true, min_rating: 4 }
+export const fetchProducts = async (params = {}, pageUrl = null) => {
   try {
-    const response = await api.get(endpoints.products);
-    return response.data;
+    const response = pageUrl
+      ? await api.get(pageUrl)
+      : await api.get(endpoints.products, { params });
+    return { results: response.data.results, next: response.data.next };
   } catch (error) {
     console.error("Error fetching products:", error);
     if (error.response) {
@@ -14,17 +20,17 @@ export const fetchProducts = async () => {
     } else {
       console.error("Request setup error:", error.message);
     }
-    return [];
+    return { results: [], next: null };
   }
 };
 
-export const searchProducts = async (query) => {
+export const searchProducts = async (query, pageUrl = null) => {
   try {
-    const response = await api.get(endpoints.productSearch(query));
-    return response.data;
+    const response = await api.get(pageUrl || endpoints.productSearch(query));
+    return { results: response.data.results, next: response.data.next };
   } catch (error) {
     console.error("Error searching products:", error);
-    return [];
+    return { results: [], next: null };
   }
 };
 
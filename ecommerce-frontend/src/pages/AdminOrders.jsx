@@ -22,8 +22,10 @@ export default function AdminOrders() {
   const [sortField, setSortField] = useState("created_at");
   const [sortOrder, setSortOrder] = useState("desc");
 
-  const itemsPerPage = 10;
-  const [currentPage, setCurrentPage] = useState(1);
+  // The list is cursor-paginated: pageUrl is the server's next/previous link (null for the first page)
+  const [pageUrl, setPageUrl] = useState(null);
+  const [nextPage, setNextPage] = useState(null);
+  const [previousPage, setPreviousPage] = useState(null);
 
   // Fetch orders list
   useEffect(() => {
@@ -37,12 +39,13 @@ export default function AdminOrders() {
         if (isPaidFilter) params.append("is_paid", isPaidFilter);
 
         const { data } = await axios.get(
-          `${endpoints.adminOrders}?${params.toString()}`,
+          pageUrl || `${endpoints.adminOrders}?${params.toString()}`,
           { headers: { Authorization: `Bearer ${token}` } }
         );
 
-        setOrders(Array.isArray(data) ? data : []);
-        setCurrentPage(1);
+        setOrders(Array.isArray(data?.results) ? data.results : []);
+        setNextPage(data?.next || null);
+        setPreviousPage(data?.previous || null);
       } catch (err) {
         setErrorOrders(err.response?.data?.detail || err.message);
       } finally {
@@ -50,7 +53,7 @@ export default function AdminOrders() {
       }
     }
     fetchOrders();
-  }, [filterStatus, isPaidFilter]);
+  }, [pageUrl, filterStatus, isPaidFilter]);
 
   // Search by tracking code
   async function handleTrackOrder() {
@@ -112,8 +115,8 @@ export default function AdminOrders() {
     }
   }
 
-  // Sorting and pagination
-  const sortedOrders = [...orders].sort((a, b) => {
+  // Sorting within the current page
+  const currentOrders = [...orders].sort((a, b) => {
     const comp =
       sortField === "total_price"
         ? a.total_price - b.total_price
@@ -121,11 +124,6 @@ export default function AdminOrders() {
     return sortOrder === "asc" ? comp : -comp;
   });
 
-  const indexOfLastOrder = currentPage * itemsPerPage;
-  const indexOfFirstOrder = indexOfLastOrder - itemsPerPage;
-  const currentOrders = sortedOrders.slice(indexOfFirstOrder, indexOfLastOrder);
-  const totalPages = Math.ceil(sortedOrders.length / itemsPerPage);
-
   function displayUser(user) {
     if (!user) return "N/A";
     if (typeof user === "string") return user;
@@ -214,7 +212,10 @@ export default function AdminOrders() {
           <select
             id="filterStatus"
             value={filterStatus}
-            onChange={(e) => setFilterStatus(e.target.value)}
+            onChange={(e) => {
+              setFilterStatus(e.target.value);
+              setPageUrl(null);
+            }}
             className="border rounded p-2"
           >
             <option value="">All</option>
@@ -233,7 +234,10 @@ export default function AdminOrders() {
           <select
             id="isPaidFilter"
             value={isPaidFilter}
-            onChange={(e) => setIsPaidFilter(e.target.value)}
+            onChange={(e) => {
+              setIsPaidFilter(e.target.value);
+              setPageUrl(null);
+            }}
             className="border rounded p-2"
           >
             <option value="">All</option>
@@ -346,28 +350,15 @@ export default function AdminOrders() {
             </ul>
             <div className="flex justify-center mt-6 space-x-2">
               <button
-                disabled={currentPage === 1}
-                onClick={() => setCurrentPage((prev) => prev - 1)}
+                disabled={!previousPage}
+                onClick={() => setPageUrl(previousPage)}
                 className="px-3 py-1 rounded border border-gray-400 disabled:opacity-50"
               >
                 Previous
               </button>
-              {[...Array(totalPages)].map((_, i) => (
-                <button
-                  key={i + 1}
-                  onClick={() => setCurrentPage(i + 1)}
-                  className={`px-3 py-1 rounded border ${
-                    currentPage === i + 1
-                      ? "bg-blue-600 text-white"
-                      : "border-gray-400"
-                  }`}
-                >
-                  {i + 1}
-                </button>
-              ))}
               <button
-                disabled={currentPage === totalPages}
-                onClick={() => setCurrentPage((prev) => prev + 1)}
+                disabled={!nextPage}
+                onClick={() => setPageUrl(nextPage)}
                 className="px-3 py-1 rounded border border-gray-400 disabled:opacity-50"
               >
                 Next
@@ -21,6 +21,7 @@ function AdminProducts() {
   });
   const [previewImage, setPreviewImage] = useState(null);
   const [errors, setErrors] = useState({});
+  const [nextPage, setNextPage] = useState(null);
 
   const token = localStorage.getItem("token");
 
@@ -29,9 +30,11 @@ function AdminProducts() {
     fetchCategories();
   }, []);
 
-  const fetchProducts = async () => {
-    const res = await getAdminProducts(token);
-    setProducts(res.data);
+  // pageUrl is the "next" link of the page already shown; without it the list restarts at page one
+  const fetchProducts = async (pageUrl = null) => {
+    const res = await getAdminProducts(pageUrl);
+    setProducts((prev) => (pageUrl ? [...prev, ...res.data.results] : res.data.results));
+    setNextPage(res.data.next);
   };
 
   const fetchCategories = async () => {
@@ -228,6 +231,14 @@ function AdminProducts() {
           </li>
         ))}
       </ul>
+      {nextPage && (
+        <button
+          onClick={() => fetchProducts(nextPage)}
+          className="mt-4 px-4 py-2 rounded border border-gray-400"
+        >
+          Load more
+        </button>
+      )}
     </div>
   );
 }
@@ -7,19 +7,34 @@ import Footer from "../components/Footer";
 function Home() {
   const [products, setProducts] = useState([]); 
   const [searchResults, setSearchResults] = useState([]); 
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchProducts()
-      .then((data) => {
-        const productArray = Array.isArray(data) ? data : [];
+      .then(({ results, next }) => {
+        const productArray = Array.isArray(results) ? results : [];
         setProducts(productArray);
         setSearchResults(productArray); 
+        setNextPage(next);
       })
       .catch((error) => {
         console.error("Error fetching products:", error);
       });
   }, []);
 
+  // Append the next cursor page
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchProducts({}, nextPage)
+      .then(({ results, next }) => {
+        setProducts((prev) => [...prev, ...results]);
+        setSearchResults((prev) => [...prev, ...results]);
+        setNextPage(next);
+      })
+      .finally(() => setLoadingMore(false));
+  };
+
   return (
     <div className="container mx-auto p-4">
       <CoverPage />
@@ -32,6 +47,17 @@ function Home() {
       </h1>
 
       <ProductList products={searchResults} />
+      {nextPage && (
+        <div className="text-center my-4">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="px-4 py-2 rounded border border-gray-400 hover:bg-gray-100 disabled:opacity-50"
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
       <Footer />
     </div>
   );
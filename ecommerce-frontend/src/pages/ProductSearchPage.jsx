@@ -11,6 +11,8 @@ function ProductSearchPage() {
 
   const [results, setResults] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const { addToCart } = useCart();
 
@@ -18,8 +20,9 @@ function ProductSearchPage() {
     const fetchSearch = async () => {
       try {
         setLoading(true);
-        const response = await searchProducts(query);
-        setResults(response);
+        const { results, next } = await searchProducts(query);
+        setResults(results);
+        setNextPage(next);
       } catch (err) {
         console.error("Search API error:", err);
       } finally {
@@ -30,6 +33,18 @@ function ProductSearchPage() {
     if (query) fetchSearch();
   }, [query]);
 
+  // Append the next cursor page of results
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const { results, next } = await searchProducts(query, nextPage);
+      setResults((prev) => [...prev, ...results]);
+      setNextPage(next);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <div className="p-4">
       <h2 className="text-xl font-semibold mb-4">
@@ -78,6 +93,17 @@ function ProductSearchPage() {
           ))}
         </div>
       )}
+      {nextPage && (
+        <div className="text-center my-4">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="px-4 py-2 rounded border border-gray-400 hover:bg-gray-100 disabled:opacity-50"
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -6,15 +6,31 @@ import { fetchProducts, searchProducts } from "../api/products";
 function ProductsPage() {
   const [results, setResults] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  // Initial fetch all products on mount
+  // Initial fetch of the first page of products on mount
   useEffect(() => {
     setLoading(true);
     fetchProducts()
-      .then(setResults)
+      .then(({ results, next }) => {
+        setResults(results);
+        setNextPage(next);
+      })
       .finally(() => setLoading(false));
   }, []);
 
+  // Append the next cursor page
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchProducts({}, nextPage)
+      .then(({ results, next }) => {
+        setResults((prev) => [...prev, ...results]);
+        setNextPage(next);
+      })
+      .finally(() => setLoadingMore(false));
+  };
+
   // Optional: you can pass searchProducts to SearchBar to handle searching
 
   return (
@@ -26,6 +42,17 @@ function ProductsPage() {
       ) : (
         <ProductList products={results} />
       )}
+      {nextPage && (
+        <div className="text-center my-4">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="px-4 py-2 rounded border border-gray-400 hover:bg-gray-100 disabled:opacity-50"
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
     </div>
   );
 }
@@ -5,6 +5,8 @@ function TrackOrder() {
   const [trackingCode, setTrackingCode] = useState("");
   const [order, setOrder] = useState(null);
   const [allOrders, setAllOrders] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState("");
   const [loading, setLoading] = useState(false);
 
@@ -12,13 +14,19 @@ function TrackOrder() {
     fetchAllOrders();
   }, []);
 
-  const fetchAllOrders = async () => {
+  // Orders come a cursor page at a time; pageUrl is the previous page's "next" link
+  const fetchAllOrders = async (pageUrl = null) => {
+    setLoadingMore(true);
     try {
-      const response = await getUserOrders();
+      const response = await getUserOrders(pageUrl);
       console.log("User orders API response:", response.data);
-      setAllOrders(response.data);
+      const results = response.data.results || [];
+      setAllOrders((prev) => (pageUrl ? [...prev, ...results] : results));
+      setNextPage(response.data.next || null);
     } catch (err) {
       setError("Failed to load your orders.");
+    } finally {
+      setLoadingMore(false);
     }
   };
 
@@ -121,6 +129,15 @@ function TrackOrder() {
               </div>
             ))}
           </div>
+          {nextPage && (
+            <button
+              onClick={() => fetchAllOrders(nextPage)}
+              disabled={loadingMore}
+              className="mt-4 px-4 py-2 rounded border border-gray-400 hover:bg-gray-100 disabled:opacity-50"
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
+          )}
         </div>
       )}
     </div>